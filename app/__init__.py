@@ -1,47 +1,103 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
+import queue
 from flask import Flask
+from flask.logging import default_handler
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
+from app.locations import LocationSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': LocationSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
+_log_listener = None
+_log_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render log records as one JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload)
+
 
 def setup_logging(app):
-    """Configure application logging"""
+    """Configure application logging
+
+    Request threads only enqueue records; a QueueListener thread does the
+    formatting and file/console I/O.
+    """
+    global _log_listener, _log_queue_handler
+
+    log_dir = app.config['LOG_DIR']
     # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
     
+    if app.config['LOG_JSON']:
+        file_formatter = console_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+        )
+        console_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
     # File handler for all logs
     file_handler = RotatingFileHandler(
-        'logs/crispy_cluckers.log',
+        os.path.join(log_dir, 'crispy_cluckers.log'),
         maxBytes=10240000,  # 10MB
         backupCount=10
     )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
-    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(file_formatter)
+    file_handler.setLevel(app.config['LOG_FILE_LEVEL'])
     
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
+    console_handler.setFormatter(console_formatter)
     console_handler.setLevel(logging.DEBUG)
+
+    # Replace any pipeline left over from a previous create_app() call
+    if _log_listener is not None:
+        _log_listener.stop()
+        app.logger.removeHandler(_log_queue_handler)
+    app.logger.removeHandler(default_handler)
+
+    log_queue = queue.SimpleQueue()
+    _log_queue_handler = QueueHandler(log_queue)
+    _log_listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _log_listener.start()
     
-    # Add handlers to app logger
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(console_handler)
-    app.logger.setLevel(logging.DEBUG)
+    # Route modules log to children of app.logger, so one handler covers them
+    app.logger.addHandler(_log_queue_handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
     app.logger.info('Crispy Cluckers startup')
 
 
+@atexit.register
+def _stop_log_listener():
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -49,23 +105,76 @@ def create_app():
     # Setup logging
     setup_logging(app)
 
+    from app.locations import configure_location_binds, init_locations
+    configure_location_binds(app)
     db.init_app(app)
     login_manager.init_app(app)
 
+    from app.cache import init_cache
+    init_cache(app)
+    init_locations(app)
+
     from app.routes.main import main_bp
     from app.routes.auth import auth_bp
     from app.routes.cart import cart_bp
     from app.routes.manager import manager_bp
+    from app.assets import assets_bp, assets_cli, asset_url, load_manifest
 
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(cart_bp)
     app.register_blueprint(manager_bp)
+    app.register_blueprint(assets_bp)
+
+    # Fingerprinted static assets (built with `flask assets build`)
+    load_manifest(app)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.cli.add_command(assets_cli)
+
+    # Amounts are integer cents; `{{ order.total_cents|money }}` renders 12.50
+    from app.money import format_money
+    app.jinja_env.filters['money'] = format_money
+
+    from app.loadtest import loadtest_cli
+    app.cli.add_command(loadtest_cli)
+
+    from app.schema import schema_cli
+    app.cli.add_command(schema_cli)
+
+    if app.config['COMPRESSION_ENABLED']:
+        from app.compression import CompressionMiddleware
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=app.config['COMPRESSION_MIN_SIZE'],
+            level=app.config['COMPRESSION_LEVEL']
+        )
+
+    # Local order journal for when the main database is unreachable
+    from app.offline import init_offline
+    init_offline(app)
 
     with app.app_context():
         from app.models import User, MenuItem, StaffCode
+        from app.schema import upgrade_schema, check_migrations
+        from app.locations import create_location_tables, location_engines, use_location
+        from app import catalog  # registers MenuItem change listeners
         db.create_all()
-        seed_data()
+        create_location_tables(app)
+        upgrade_schema()
+        for _, engine in location_engines(app):
+            upgrade_schema(engine)
+        for engine in [db.engine] + [engine for _, engine in location_engines(app)]:
+            check_migrations(engine)
+        for location in app.config['LOCATIONS']:
+            with use_location(location):
+                seed_data()
+
+        from app.replica import init_replica
+        init_replica(app, db)
+
+    # Precomputed dashboard snapshots
+    from app.dashboard import init_dashboard
+    init_dashboard(app)
 
     return app
 
@@ -87,7 +196,7 @@ def seed_data():
             MenuItem(
                 name='Original Chicken Sandwich Combo',
                 description='Crispy chicken sandwich with lettuce, mayo, served with fries and a drink.',
-                price=7.99,
+                price_cents=799,
                 image_url='https://images.unsplash.com/photo-1606755962773-d324e0a13086?w=400&h=300&fit=crop',
                 category='combos',
                 popular=True
@@ -95,7 +204,7 @@ def seed_data():
             MenuItem(
                 name='Classic Burger Combo',
                 description='Juicy beef patty with lettuce, tomato, pickles, fries and drink.',
-                price=8.99,
+                price_cents=899,
                 image_url='https://images.unsplash.com/photo-1568901346375-23c9450c58cd?w=400&h=300&fit=crop',
                 category='combos',
                 popular=True
@@ -103,14 +212,14 @@ def seed_data():
             MenuItem(
                 name='BBQ Pulled Pork Combo',
                 description='Slow-cooked pulled pork with tangy BBQ sauce, coleslaw, fries and drink.',
-                price=9.99,
+                price_cents=999,
                 image_url='https://images.unsplash.com/photo-1529193591184-b1d58069ecdd?w=400&h=300&fit=crop',
                 category='combos'
             ),
             MenuItem(
                 name='Crispy Chicken Tenders',
                 description='Hand-breaded golden chicken tenders with your choice of dipping sauce.',
-                price=8.99,
+                price_cents=899,
                 image_url='https://images.unsplash.com/photo-1562967914-608f82629710?w=400&h=300&fit=crop',
                 category='chicken',
                 popular=True
@@ -118,7 +227,7 @@ def seed_data():
             MenuItem(
                 name='Nashville Hot Chicken',
                 description='Fiery Nashville-style hot chicken on a brioche bun with pickles.',
-                price=10.99,
+                price_cents=1099,
                 image_url='https://images.unsplash.com/photo-1626645738196-c2a7c87a8f58?w=400&h=300&fit=crop',
                 category='chicken',
                 spicy=True
@@ -126,21 +235,21 @@ def seed_data():
             MenuItem(
                 name='Classic Wings (8pc)',
                 description='Crispy bone-in wings tossed in your choice of Buffalo, BBQ, or Honey Garlic.',
-                price=11.99,
+                price_cents=1199,
                 image_url='https://images.unsplash.com/photo-1567620832903-9fc6debc209f?w=400&h=300&fit=crop',
                 category='chicken'
             ),
             MenuItem(
                 name='Chicken & Waffles',
                 description='Crispy fried chicken on fluffy Belgian waffles with maple syrup.',
-                price=12.99,
+                price_cents=1299,
                 image_url='https://images.unsplash.com/photo-1504544750208-dc0358e63f7f?w=400&h=300&fit=crop',
                 category='chicken'
             ),
             MenuItem(
                 name='Crispy Fries',
                 description='Golden, crispy fries seasoned to perfection.',
-                price=3.99,
+                price_cents=399,
                 image_url='https://images.unsplash.com/photo-1573080496219-bb080dd4f877?w=400&h=300&fit=crop',
                 category='sides',
                 popular=True
@@ -148,28 +257,28 @@ def seed_data():
             MenuItem(
                 name='Mac & Cheese',
                 description='Creamy, cheesy mac and cheese made with three cheeses.',
-                price=4.99,
+                price_cents=499,
                 image_url='https://images.unsplash.com/photo-1543339494-b4cd4f7ba686?w=400&h=300&fit=crop',
                 category='sides'
             ),
             MenuItem(
                 name='Coleslaw',
                 description='Fresh, creamy coleslaw with a tangy dressing.',
-                price=2.99,
+                price_cents=299,
                 image_url='https://images.unsplash.com/photo-1625938145744-e380515399bf?w=400&h=300&fit=crop',
                 category='sides'
             ),
             MenuItem(
                 name='Fresh Lemonade',
                 description='Freshly squeezed lemonade, perfectly sweet and tangy.',
-                price=3.49,
+                price_cents=349,
                 image_url='https://images.unsplash.com/photo-1621263764928-df1444c5e859?w=400&h=300&fit=crop',
                 category='drinks'
             ),
             MenuItem(
                 name='Sweet Tea',
                 description='Classic Southern sweet iced tea.',
-                price=2.49,
+                price_cents=249,
                 image_url='https://images.unsplash.com/photo-1556679343-c7306c1976bc?w=400&h=300&fit=crop',
                 category='drinks'
             ),
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import click
+from flask import Blueprint, current_app, request, send_from_directory, url_for, abort
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+assets_bp = Blueprint('assets', __name__)
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = None
+
+
+def _dist_folder():
+    return os.path.join(current_app.static_folder, DIST_DIR)
+
+
+def _write_atomic(path, data):
+    """Replace `path` in one step, so it is never seen half-written"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder):
+    """Fingerprint every static file and pre-compress the text ones
+
+    Each file is copied into static/dist as name.<hash>.ext next to .gz
+    (and .br when brotli is installed) variants that are only kept if
+    smaller. A manifest maps the logical path to the hashed one.
+    Returns the manifest.
+
+    Earlier builds are left in place: running workers keep serving the
+    manifest they loaded, so their files must outlive the swap. Once every
+    worker runs on the new manifest, prune_assets() removes the rest.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root).startswith(os.path.abspath(dist)):
+            continue
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{stem}.{digest}{ext}'
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write_atomic(target, data)
+
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+                if brotli is not None:
+                    variants.append(('.br', brotli.compress(data, quality=11)))
+                for suffix, compressed in variants:
+                    if len(compressed) < len(data):
+                        _write_atomic(target + suffix, compressed)
+
+            manifest[logical] = hashed
+            logger.debug('Built asset %s -> %s', logical, hashed)
+
+    _write_atomic(os.path.join(dist, MANIFEST_NAME),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def prune_assets(static_folder):
+    """Delete built files the current manifest doesn't reference
+
+    Only safe once no worker still serves an older manifest. Returns the
+    number of files removed.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    try:
+        with open(os.path.join(dist, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    keep = {MANIFEST_NAME}
+    for hashed in manifest.values():
+        keep.update(hashed + suffix for suffix in ('', '.gz', '.br'))
+
+    removed = 0
+    for root, dirs, files in os.walk(dist, topdown=False):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, dist).replace(os.sep, '/') not in keep:
+                os.remove(path)
+                removed += 1
+        if root != dist and not os.listdir(root):
+            os.rmdir(root)
+    return removed
+
+
+def load_manifest(app):
+    """Read the build manifest, or an empty one if assets were never built"""
+    global _manifest
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            _manifest = json.load(f)
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+
+def asset_url(filename):
+    """URL for a static file, fingerprinted when a build is available
+
+    Debug mode always serves the live file so edits show up without a
+    rebuild.
+    """
+    hashed = (_manifest or {}).get(filename)
+    if hashed and not current_app.debug:
+        return url_for('assets.serve_asset', filename=hashed)
+    return url_for('static', filename=filename)
+
+
+@assets_bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted file, picking a precompressed variant if accepted"""
+    folder = _dist_folder()
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accepted = request.accept_encodings
+
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(os.path.join(folder, filename + suffix)):
+            response = send_from_directory(folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        if not os.path.isfile(os.path.join(folder, filename)):
+            abort(404)
+        response = send_from_directory(folder, filename, mimetype=mimetype)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.command('build')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress files under app/static"""
+    manifest = build_assets(current_app.static_folder)
+    load_manifest(current_app)
+    click.echo(f'Built {len(manifest)} assets into {_dist_folder()}')
+
+
+@click.command('prune')
+@with_appcontext
+def prune_assets_command():
+    """Delete earlier builds once every worker runs on the current one"""
+    removed = prune_assets(current_app.static_folder)
+    click.echo(f'Removed {removed} files from {_dist_folder()}')
+
+
+assets_cli = click.Group('assets', help='Static asset pipeline.')
+assets_cli.add_command(build_assets_command)
+assets_cli.add_command(prune_assets_command)
@@ -0,0 +1,395 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import redis
+except ImportError:  # redis is optional; only needed for CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Tag versions outlive the entries that carry them. A version that expired
+# or was evicted only turns those entries into misses.
+TAG_TTL = 24 * 60 * 60
+
+_MISSING = object()
+_regions = {}
+
+
+class MemoryBackend:
+    """Bounded LRU store with per-entry expiry, private to this process
+
+    Values are stored and returned as-is, so every caller gets the same
+    object.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, value):
+        return value
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return self._decode(value)
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        value = self._encode(value)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class StubBackend(MemoryBackend):
+    """In-process stand-in for a shared backend, for development and tests
+
+    Values are pickled on the way in and out like they are for Redis, so
+    callers get copies and unpicklable values fail the same way.
+    """
+
+    name = 'stub'
+
+    def _encode(self, value):
+        return pickle.dumps(value)
+
+    def _decode(self, value):
+        return pickle.loads(value)
+
+
+class RedisBackend:
+    """Cache shared by every worker through a Redis server"""
+
+    name = 'redis'
+    evictions = 0  # Redis applies its own maxmemory policy
+
+    def __init__(self, url, prefix='crispy:'):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis needs the redis package installed')
+        if not url:
+            raise RuntimeError('CACHE_BACKEND=redis needs CACHE_URL')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._prefix = prefix
+
+    def get(self, key):
+        data = self._client.get(self._prefix + key)
+        return _MISSING if data is None else pickle.loads(data)
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [_MISSING if data is None else pickle.loads(data)
+                for data in self._client.mget([self._prefix + key for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self._prefix + '*'):
+            self._client.delete(key)
+
+    def size(self):
+        return None
+
+
+BACKENDS = {'memory': MemoryBackend, 'stub': StubBackend, 'redis': RedisBackend}
+
+
+def init_cache(app):
+    """Create the backend shared by every cache region
+
+    CACHE_BACKEND 'none' turns caching off; regions then call their
+    loaders every time.
+    """
+    kind = app.config['CACHE_BACKEND']
+    if kind == 'none':
+        backend = None
+    elif kind == 'redis':
+        backend = RedisBackend(app.config['CACHE_URL'])
+    elif kind in BACKENDS:
+        backend = BACKENDS[kind](app.config['CACHE_MAX_ENTRIES'])
+    else:
+        raise RuntimeError(f'Unknown CACHE_BACKEND {kind!r}')
+    app.extensions['cache'] = backend
+    logger.info('Cache backend: %s', kind)
+
+
+def _backend():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('cache')
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def _new_version():
+    return os.urandom(6).hex()
+
+
+class _Flight:
+    """One in-progress load that concurrent misses wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Cache:
+    """A named region of the shared cache
+
+    Entries expire after the number of seconds in the `ttl_setting` config
+    key (0 disables the region) and are also dropped once any tag they were
+    stored under is invalidated. Concurrent misses for one key in a process
+    share a single load. None is never cached.
+
+    Cached values are shared: the memory backend hands every caller the
+    same object, so treat them as read-only and copy before changing
+    anything. The stub backend returns copies, like Redis does.
+    Values must also be picklable for the shared backends; keep secrets
+    such as password hashes out of them.
+    """
+
+    def __init__(self, name, ttl_setting):
+        self.name = name
+        self.ttl_setting = ttl_setting
+        self.hits = self.misses = self.loads = self.coalesced = self.errors = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+        _regions[name] = self
+
+    def _key(self, key):
+        if isinstance(key, tuple):
+            key = ':'.join(str(part) for part in key)
+        return f'{self.name}:{key}'
+
+    def _bump(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _ttl(self, backend):
+        return current_app.config[self.ttl_setting] if backend is not None else 0
+
+    def _read(self, backend, key):
+        try:
+            entry = backend.get(key)
+            if entry is _MISSING:
+                return _MISSING
+            tags, versions, value = entry
+            if tags and backend.get_many([_tag_key(tag) for tag in tags]) != list(versions):
+                return _MISSING
+            return value
+        except Exception:
+            self._bump('errors')
+            logger.warning('Cache read failed for %s', key, exc_info=True)
+            return _MISSING
+
+    def _tag_versions(self, backend, tags):
+        """Current version of each tag, creating the missing ones
+
+        Taken before loading, so a value loaded while one of its tags is
+        invalidated is stored under the old version and never served.
+        """
+        keys = [_tag_key(tag) for tag in tags]
+        versions = backend.get_many(keys)
+        for i, version in enumerate(versions):
+            if version is _MISSING:
+                versions[i] = _new_version()
+                backend.set(keys[i], versions[i], TAG_TTL)
+        return tuple(versions)
+
+    def _write(self, backend, key, tags, versions, value, ttl):
+        try:
+            if versions is None:
+                versions = self._tag_versions(backend, tags)
+            backend.set(key, (tuple(tags), versions, value), ttl)
+        except Exception:
+            self._bump('errors')
+            logger.warning('Cache write failed for %s', key, exc_info=True)
+
+    def _load(self, backend, key, loader, tags, ttl):
+        try:
+            versions = self._tag_versions(backend, tags)
+        except Exception:
+            versions = None
+        value = loader()
+        self._bump('loads')
+        if value is not None:
+            self._write(backend, key, tags, versions, value, ttl)
+        return value
+
+    def get_or_load(self, key, loader, tags=()):
+        """Cached value for `key`, calling `loader()` to fill a miss"""
+        backend = _backend()
+        ttl = self._ttl(backend)
+        if ttl <= 0:
+            return loader()
+
+        key = self._key(key)
+        value = self._read(backend, key)
+        if value is not _MISSING:
+            self._bump('hits')
+            return value
+        self._bump('misses')
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._bump('coalesced')
+            return flight.wait()
+
+        try:
+            value = flight.value = self._load(backend, key, loader, tags, ttl)
+            return value
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def refresh(self, key, loader, tags=()):
+        """Reload and store a value even if the cached one is still fresh"""
+        backend = _backend()
+        ttl = self._ttl(backend)
+        if ttl <= 0:
+            return loader()
+        return self._load(backend, self._key(key), loader, tags, ttl)
+
+    def set(self, key, value, tags=()):
+        """Store a value directly, e.g. to keep serving a stale one"""
+        backend = _backend()
+        ttl = self._ttl(backend)
+        if ttl > 0 and value is not None:
+            self._write(backend, self._key(key), tags, None, value, ttl)
+
+    def delete(self, key):
+        backend = _backend()
+        if backend is not None:
+            backend.delete(self._key(key))
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'loads': self.loads,
+            'coalesced': self.coalesced,
+            'errors': self.errors
+        }
+
+
+def cached(cache, key, tags=None):
+    """Cache a function's result in `cache`
+
+    `key` (and `tags`, when given) are called with the function's
+    arguments.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return cache.get_or_load(
+                key(*args, **kwargs),
+                lambda: f(*args, **kwargs),
+                tags=tags(*args, **kwargs) if tags else ()
+            )
+        return decorated_function
+    return decorator
+
+
+def invalidate_tags(*tags, session=None):
+    """Drop every cached entry stored under any of `tags`
+
+    With a session the tags are invalidated again once it commits, so a
+    reader that loaded the old rows in between can't keep them cached.
+    """
+    backend = _backend()
+    if backend is None:
+        return
+    for tag in tags:
+        try:
+            backend.set(_tag_key(tag), _new_version(), TAG_TTL)
+        except Exception:
+            logger.warning('Cache invalidation failed for %s', tag, exc_info=True)
+    if session is not None:
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(db_session):
+    tags = db_session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(db_session):
+    db_session.info.pop('cache_tags', None)
+
+
+def cache_metrics():
+    """Hit/miss counters per region plus backend totals"""
+    backend = _backend()
+    return {
+        'backend': backend.name if backend is not None else 'none',
+        'entries': backend.size() if backend is not None else 0,
+        'evictions': backend.evictions if backend is not None else 0,
+        'regions': {name: region.metrics() for name, region in sorted(_regions.items())}
+    }
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.locations import current_location
+from app.models import Order
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_STATUSES = ('paid', 'preparing')
+
+
+class KitchenFullError(Exception):
+    """Raised when an order can't be admitted into the requested pickup slot
+
+    `offer` is the next slot with room, or None if every slot within the
+    booking horizon is full.
+    """
+
+    def __init__(self, offer=None):
+        super().__init__('Kitchen is at capacity')
+        self.offer = offer
+
+
+class KitchenCapacity:
+    """In-memory count of in-flight orders per pickup slot, per location
+
+    Checkout admits orders against these counters without touching the
+    database. Counts are resynced from the orders table every
+    KITCHEN_RESYNC_SECONDS so separate worker processes converge. Each
+    location's kitchen is counted separately; methods act on the current
+    location.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # location -> {slot: count}
+        self._slots = {}
+        self._synced_at = {}
+
+    def slot_for(self, when):
+        """Floor a datetime to the start of its pickup slot
+
+        Slots are counted from midnight, so lengths that don't divide an
+        hour still line up; if the length doesn't divide a day the last
+        slot before midnight is shorter.
+        """
+        minutes = current_app.config['KITCHEN_SLOT_MINUTES']
+        floored = when.replace(second=0, microsecond=0)
+        return floored - timedelta(minutes=(floored.hour * 60 + floored.minute) % minutes)
+
+    def next_slot(self, slot):
+        """Start of the slot after `slot`"""
+        midnight = datetime.combine(slot.date() + timedelta(days=1), datetime.min.time())
+        return min(slot + timedelta(minutes=current_app.config['KITCHEN_SLOT_MINUTES']), midnight)
+
+    def first_slot_from(self, when):
+        """Start of the first slot beginning at or after `when`"""
+        slot = self.slot_for(when)
+        return slot if slot == when else self.next_slot(slot)
+
+    def _sync(self, location, now):
+        oldest = self.slot_for(now) - timedelta(minutes=current_app.config['KITCHEN_SLOT_MINUTES'])
+        rows = db.session.query(Order.pickup_at, func.count(Order.id)).filter(
+            Order.status.in_(IN_FLIGHT_STATUSES),
+            Order.pickup_at >= oldest
+        ).group_by(Order.pickup_at).all()
+        self._slots[location] = {slot: count for slot, count in rows}
+        self._synced_at[location] = time.monotonic()
+        logger.debug('Kitchen capacity resynced for %s - %d active slots', location, len(rows))
+
+    def _slots_for(self, location, now):
+        interval = current_app.config['KITCHEN_RESYNC_SECONDS']
+        synced_at = self._synced_at.get(location)
+        if synced_at is None or time.monotonic() - synced_at >= interval:
+            self._sync(location, now)
+        return self._slots[location]
+
+    def admit(self, requested_slot=None, now=None):
+        """Reserve room for one order and return its pickup slot
+
+        Without a requested slot the order goes into the earliest slot the
+        kitchen can make. If that slot (or the requested one) is full,
+        KitchenFullError carries the next slot that has room.
+        """
+        capacity = current_app.config['KITCHEN_SLOT_CAPACITY']
+        now = now or datetime.utcnow()
+        # The kitchen needs the full lead time, so round up to a slot start
+        earliest = self.first_slot_from(now + timedelta(minutes=current_app.config['KITCHEN_LEAD_MINUTES']))
+        latest = earliest
+        for _ in range(current_app.config['KITCHEN_SLOTS_AHEAD']):
+            latest = self.next_slot(latest)
+
+        slot = earliest
+        if requested_slot and earliest <= requested_slot <= latest:
+            slot = self.slot_for(requested_slot)
+
+        with self._lock:
+            slots = self._slots_for(current_location(), now)
+            if not capacity or slots.get(slot, 0) < capacity:
+                slots[slot] = slots.get(slot, 0) + 1
+                return slot
+
+            offer = None
+            candidate = slot
+            while candidate < latest:
+                candidate = self.next_slot(candidate)
+                if slots.get(candidate, 0) < capacity:
+                    offer = candidate
+                    break
+
+        logger.info('Kitchen slot %s full, offering %s', slot, offer)
+        raise KitchenFullError(offer)
+
+    def release(self, slot):
+        """Give back a slot reserved by admit()"""
+        if slot is None:
+            return
+        with self._lock:
+            slots = self._slots.get(current_location(), {})
+            if slots.get(slot, 0) > 0:
+                slots[slot] -= 1
+
+    def status_changed(self, slot, old_status, new_status):
+        """Keep slot counts in step with an order's status transition"""
+        was_in_flight = old_status in IN_FLIGHT_STATUSES
+        is_in_flight = new_status in IN_FLIGHT_STATUSES
+        if was_in_flight and not is_in_flight:
+            self.release(slot)
+        elif is_in_flight and not was_in_flight and slot is not None:
+            with self._lock:
+                slots = self._slots.get(current_location())
+                if slots is not None:
+                    slots[slot] = slots.get(slot, 0) + 1
+
+    def reset(self):
+        """Forget all counts; the next admit() reloads them"""
+        with self._lock:
+            self._slots = {}
+            self._synced_at = {}
+
+
+kitchen = KitchenCapacity()
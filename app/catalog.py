@@ -0,0 +1,92 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import object_session
+from app.cache import Cache, invalidate_tags
+from app.locations import current_location
+from app.models import MenuItem
+
+logger = logging.getLogger(__name__)
+
+catalog_cache = Cache('catalog', 'CATALOG_CACHE_TTL')
+# location -> last snapshot loaded, served while the database is unreachable
+_last_good = {}
+
+
+def catalog_tag(location):
+    return f'catalog:{location}'
+
+
+def _menu_item_dict(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'price_cents': item.price_cents,
+        'image_url': item.image_url,
+        'category': item.category,
+        'popular': item.popular,
+        'spicy': item.spicy,
+        'stock': item.stock,
+    }
+
+
+def _load_catalog():
+    items = MenuItem.query.filter_by(available=True).order_by(MenuItem.id).all()
+    snapshot = [_menu_item_dict(item) for item in items]
+    logger.debug('Catalog snapshot rebuilt for %s - %d items', current_location(), len(snapshot))
+    return snapshot
+
+
+def get_catalog():
+    """Return the current location's available menu items as plain dicts
+
+    Each location has its own snapshot in the catalog cache region. A
+    snapshot is dropped by invalidate_catalog() whenever its items change
+    and otherwise expires after CATALOG_CACHE_TTL seconds, which bounds how
+    stale other worker processes can be. If the database can't be reached
+    the last snapshot keeps being served.
+    """
+    location = current_location()
+    try:
+        snapshot = catalog_cache.get_or_load(location, _load_catalog, tags=[catalog_tag(location)])
+    except DBAPIError:
+        snapshot = _last_good.get(location)
+        if snapshot is None:
+            raise
+        logger.warning('Catalog reload failed for %s, serving the previous snapshot', location)
+        catalog_cache.set(location, snapshot, tags=[catalog_tag(location)])
+    _last_good[location] = snapshot
+    return snapshot
+
+
+def get_menu_items(category=None, popular=None):
+    """Filter the cached catalog by category and/or popular flag"""
+    items = get_catalog()
+    if category and category != 'all':
+        items = [item for item in items if item['category'] == category]
+    if popular is not None:
+        items = [item for item in items if item['popular'] == popular]
+    return items
+
+
+def get_catalog_item(item_id):
+    """An available item from the cached catalog, or None"""
+    for item in get_catalog():
+        if item['id'] == item_id:
+            return item
+    return None
+
+
+def invalidate_catalog(location=None, session=None):
+    """Drop a location's cached catalog (the current one by default)"""
+    location = location or current_location()
+    invalidate_tags(catalog_tag(location), session=session)
+    logger.debug('Catalog snapshot invalidated for %s', location)
+
+
+@event.listens_for(MenuItem, 'after_insert')
+@event.listens_for(MenuItem, 'after_update')
+@event.listens_for(MenuItem, 'after_delete')
+def _menu_item_changed(mapper, connection, target):
+    invalidate_catalog(target.location, session=object_session(target))
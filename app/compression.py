@@ -0,0 +1,167 @@
+import logging
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits=31 -> gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """WSGI middleware that gzip/brotli-encodes compressible responses
+
+    Responses with a Content-Length below `min_size`, an existing
+    Content-Encoding, a non-text content type, or a partial range are
+    passed through untouched. Responses without a Content-Length are
+    treated as streams and compressed chunk by chunk, flushing after each
+    chunk so clients still receive data as it is produced.
+    """
+
+    def __init__(self, wsgi_app, min_size=500, level=6):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.level = level
+
+    def _negotiate(self, environ):
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _new_stream(self, encoding):
+        return _BrotliStream(self.level) if encoding == 'br' else _GzipStream(self.level)
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        if 'Content-Encoding' in headers or 'Content-Range' in headers:
+            return False
+        content_type = headers.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get('Content-Length')
+        if length is not None and int(length) < self.min_size:
+            return False
+        return True
+
+    def __call__(self, environ, start_response):
+        encoding = self._negotiate(environ)
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        state = {}
+        written = []
+
+        def capture_start_response(status, response_headers, exc_info=None):
+            state['status'] = status
+            state['headers'] = Headers(response_headers)
+            state['exc_info'] = exc_info
+            return written.append
+
+        body = self.wsgi_app(environ, capture_start_response)
+        status, headers = state['status'], state['headers']
+
+        if not self._should_compress(status, headers):
+            start_response(status, headers.to_wsgi_list(), state['exc_info'])
+            return _chain(written, body)
+
+        headers['Content-Encoding'] = encoding
+        vary = headers.get('Vary')
+        headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = 'W/' + etag
+
+        if 'Content-Length' in headers:
+            # Known size: compress in one go and send an exact length
+            stream = self._new_stream(encoding)
+            try:
+                chunks = [stream.compress(chunk) for chunk in _chain(written, body)]
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            chunks.append(stream.finish())
+            data = b''.join(chunks)
+            headers['Content-Length'] = str(len(data))
+            start_response(status, headers.to_wsgi_list(), state['exc_info'])
+            return [data]
+
+        start_response(status, headers.to_wsgi_list(), state['exc_info'])
+        return self._stream(encoding, written, body)
+
+    def _stream(self, encoding, written, body):
+        stream = self._new_stream(encoding)
+        try:
+            for chunk in _chain(written, body):
+                if chunk:
+                    yield stream.compress(chunk) + stream.flush()
+            yield stream.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+def _chain(first, body):
+    if not first:
+        return body
+    return _ChainedBody(first, body)
+
+
+class _ChainedBody:
+    """Iterates buffered write() output, then the body, keeping body.close()"""
+
+    def __init__(self, first, body):
+        self._first = first
+        self._body = body
+
+    def __iter__(self):
+        yield from self._first
+        yield from self._body
+
+    def close(self):
+        if hasattr(self._body, 'close'):
+            self._body.close()
@@ -0,0 +1,316 @@
+import json
+import logging
+import threading
+import time
+import click
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, event, extract, func
+from sqlalchemy.orm import Session, joinedload, object_session, selectinload
+from app import db
+from app.cache import Cache, cached, invalidate_tags
+from app.locations import current_location, use_location
+from app.models import MenuItem, Order, OrderItem, StaffClockIn
+from app.replica import replica_reads
+from app.stats import get_stats
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('paid', 'preparing', 'ready')
+RECENT_ORDERS = 50
+# A burst of changes is folded into one rebuild per this many seconds
+MIN_REBUILD_SECONDS = 1
+
+snapshot_cache = Cache('dashboard', 'DASHBOARD_SNAPSHOT_TTL')
+_changed = threading.Event()
+
+
+def dashboard_tag(location):
+    return f'dashboard:{location}'
+
+
+analytics_cache = Cache('analytics', 'CACHE_ANALYTICS_TTL')
+
+
+@cached(analytics_cache, key=lambda: current_location())
+def get_analytics():
+    """Calculate comprehensive analytics, reused for CACHE_ANALYTICS_TTL seconds
+
+    Counts and revenue are summed in the database, revenue in integer cents.
+    """
+    today = datetime.utcnow().date()
+    today_start = datetime.combine(today, datetime.min.time())
+    week_start = today_start - timedelta(days=7)
+    month_start = today_start - timedelta(days=30)
+    counted = Order.status != 'cancelled'
+
+    def since(start):
+        in_range = Order.created_at >= start
+        return (func.sum(case((in_range, 1), else_=0)),
+                func.sum(case((in_range, Order.total_cents), else_=0)))
+
+    # Today's, this week's and this month's orders and revenue in one pass
+    today_orders, today_revenue, week_orders, week_revenue, month_orders, month_revenue = db.session.query(
+        *since(today_start), *since(week_start), *since(month_start)
+    ).filter(counted, Order.created_at >= month_start).one()
+    today_orders, week_orders, month_orders = today_orders or 0, week_orders or 0, month_orders or 0
+    today_revenue, week_revenue, month_revenue = today_revenue or 0, week_revenue or 0, month_revenue or 0
+
+    # Average order value, rounded half up to the cent
+    avg_order = (month_revenue + month_orders // 2) // month_orders if month_orders else 0
+    
+    # Top selling items (last 30 days)
+    top_items = db.session.query(
+        OrderItem.name,
+        func.sum(OrderItem.quantity).label('total_qty')
+    ).join(Order).filter(
+        Order.created_at >= month_start,
+        counted
+    ).group_by(OrderItem.name).order_by(func.sum(OrderItem.quantity).desc()).limit(5).all()
+    
+    # Hourly distribution for today
+    hour = extract('hour', Order.created_at)
+    hourly_orders = dict(db.session.query(hour, func.count(Order.id)).filter(
+        Order.created_at >= today_start,
+        counted
+    ).group_by(hour).all())
+    
+    # Daily revenue for the past 7 days
+    day_column = func.date(Order.created_at)
+    by_day = {str(day): (orders, revenue) for day, orders, revenue in db.session.query(
+        day_column, func.count(Order.id), func.sum(Order.total_cents)
+    ).filter(
+        Order.created_at >= today_start - timedelta(days=6),
+        counted
+    ).group_by(day_column).all()}
+    daily_revenue = []
+    for i in range(6, -1, -1):
+        day = today - timedelta(days=i)
+        orders, revenue = by_day.get(day.isoformat(), (0, 0))
+        daily_revenue.append({
+            'date': day.strftime('%a'),
+            'revenue_cents': revenue or 0,
+            'orders': orders
+        })
+    
+    return {
+        'today_orders': today_orders,
+        'today_revenue_cents': today_revenue,
+        'week_orders': week_orders,
+        'week_revenue_cents': week_revenue,
+        'month_orders': month_orders,
+        'month_revenue_cents': month_revenue,
+        'avg_order_value_cents': avg_order,
+        'top_items': [tuple(row) for row in top_items],
+        'hourly_orders': hourly_orders,
+        'daily_revenue': daily_revenue
+    }
+
+
+def _order_doc(order):
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'customer_name': order.customer_name,
+        'customer_phone': order.customer_phone,
+        'status': order.status,
+        'total_cents': order.total_cents,
+        'created_at': order.created_at.isoformat(),
+        'items': [{'name': item.name, 'quantity': item.quantity} for item in order.items]
+    }
+
+
+def _clock_doc(clock):
+    return {
+        'id': clock.id,
+        'user': {'name': clock.user.name, 'email': clock.user.email, 'role': clock.user.role},
+        'clock_in': clock.clock_in.isoformat(),
+        'clock_out': clock.clock_out.isoformat() if clock.clock_out else None,
+        'break_minutes': clock.break_minutes or 0
+    }
+
+
+def build_snapshot():
+    """Compute the current location's dashboard as a JSON document
+
+    Holds everything the board shows that doesn't depend on who is looking
+    at it. Reads go to the replica unless this client just wrote.
+    """
+    with replica_reads():
+        recent_orders = Order.query.options(selectinload(Order.items)).order_by(
+            Order.created_at.desc()
+        ).limit(RECENT_ORDERS).all()
+        active_orders = Order.query.options(selectinload(Order.items)).filter(
+            Order.status.in_(ACTIVE_STATUSES)
+        ).order_by(Order.created_at.desc()).limit(RECENT_ORDERS).all()
+        on_shift = StaffClockIn.query.options(joinedload(StaffClockIn.user)).filter_by(clock_out=None).all()
+        today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        today_clocks = StaffClockIn.query.options(joinedload(StaffClockIn.user)).filter(
+            StaffClockIn.clock_in >= today_start
+        ).order_by(StaffClockIn.clock_in.desc()).all()
+        menu_items = MenuItem.query.order_by(MenuItem.category, MenuItem.name).all()
+        document = {
+            'location': current_location(),
+            'built_at': datetime.utcnow().isoformat(),
+            'stats': get_stats(),
+            'analytics': get_analytics(),
+            'orders': [_order_doc(order) for order in recent_orders],
+            'active_orders': [_order_doc(order) for order in active_orders],
+            'active_staff': [_clock_doc(clock) for clock in on_shift],
+            'today_clocks': [_clock_doc(clock) for clock in today_clocks],
+            'menu_items': [{'id': item.id, 'name': item.name, 'available': item.available, 'stock': item.stock}
+                           for item in menu_items]
+        }
+    logger.debug('Dashboard snapshot built for %s', document['location'])
+    return json.dumps(document)
+
+
+def _hydrate_order(doc):
+    return SimpleNamespace(**dict(
+        doc,
+        created_at=datetime.fromisoformat(doc['created_at']),
+        items=[SimpleNamespace(**item) for item in doc['items']]
+    ))
+
+
+def _hydrate_clock(doc):
+    clock_in = datetime.fromisoformat(doc['clock_in'])
+    clock_out = datetime.fromisoformat(doc['clock_out']) if doc['clock_out'] else None
+    return SimpleNamespace(**dict(
+        doc,
+        user=SimpleNamespace(**doc['user']),
+        clock_in=clock_in,
+        clock_out=clock_out,
+        hours_worked=StaffClockIn.hours_between(clock_in, clock_out, doc['break_minutes'])
+    ))
+
+
+def _hydrate_analytics(doc):
+    # JSON turned the hour keys into strings and the (name, qty) pairs into lists
+    return dict(
+        doc,
+        hourly_orders={int(hour): count for hour, count in doc['hourly_orders'].items()},
+        top_items=[tuple(item) for item in doc['top_items']]
+    )
+
+
+def get_snapshot():
+    """The current location's dashboard snapshot, ready for the template
+
+    Every viewer shares one snapshot per location. It is rebuilt by the
+    materializer if one runs, and otherwise by the first request after a
+    change to orders, clock-ins or the menu or once it expires
+    (concurrent requests wait for that one build). Times are turned back into datetimes and shift hours are
+    worked out at read time.
+    """
+    location = current_location()
+    document = json.loads(snapshot_cache.get_or_load(location, build_snapshot, tags=[dashboard_tag(location)]))
+    return SimpleNamespace(
+        built_at=datetime.fromisoformat(document['built_at']),
+        stats=document['stats'],
+        analytics=_hydrate_analytics(document['analytics']),
+        orders=[_hydrate_order(doc) for doc in document['orders']],
+        active_orders=[_hydrate_order(doc) for doc in document['active_orders']],
+        active_staff=[_hydrate_clock(doc) for doc in document['active_staff']],
+        today_clocks=[_hydrate_clock(doc) for doc in document['today_clocks']],
+        menu_items=[SimpleNamespace(**doc) for doc in document['menu_items']]
+    )
+
+
+def publish_snapshot():
+    """Rebuild the current location's snapshot and replace the stored one"""
+    location = current_location()
+    snapshot_cache.refresh(location, build_snapshot, tags=[dashboard_tag(location)])
+
+
+@event.listens_for(Order, 'after_insert')
+@event.listens_for(Order, 'after_update')
+@event.listens_for(Order, 'after_delete')
+@event.listens_for(StaffClockIn, 'after_insert')
+@event.listens_for(StaffClockIn, 'after_update')
+@event.listens_for(StaffClockIn, 'after_delete')
+@event.listens_for(MenuItem, 'after_insert')
+@event.listens_for(MenuItem, 'after_update')
+@event.listens_for(MenuItem, 'after_delete')
+def _board_row_changed(mapper, connection, target):
+    db_session = object_session(target)
+    invalidate_tags(dashboard_tag(target.location), session=db_session)
+    if db_session is not None:
+        db_session.info['dashboard_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_materializer(db_session):
+    if db_session.info.pop('dashboard_changed', False):
+        _changed.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(db_session):
+    db_session.info.pop('dashboard_changed', None)
+
+
+def init_dashboard(app):
+    """Start the snapshot materializer thread if configured
+
+    The thread only runs with DASHBOARD_SNAPSHOT_THREAD set, on a single
+    process. Deployments with a shared cache run `flask dashboard
+    materialize` instead; otherwise snapshots are built on demand.
+
+    A per-process cache only hears about this worker's own changes, so
+    without redis snapshots expire as soon as the polled counters do.
+    """
+    app.cli.add_command(dashboard_cli)
+    if app.config['CACHE_BACKEND'] != 'redis':
+        app.config['DASHBOARD_SNAPSHOT_TTL'] = min(app.config['DASHBOARD_SNAPSHOT_TTL'],
+                                                   app.config['STATS_CACHE_TTL'])
+    if app.config['DASHBOARD_SNAPSHOT_THREAD'] and app.config['DASHBOARD_SNAPSHOT_INTERVAL'] > 0:
+        thread = threading.Thread(target=_materialize_loop, args=(app,), name='dashboard-snapshots', daemon=True)
+        thread.start()
+
+
+def _materialize_loop(app):
+    """Refresh every location's snapshot on a timer, and soon after changes
+
+    On the timer each snapshot is rebuilt outright. After a change only
+    the invalidated snapshots are rebuilt, sharing the build with any
+    request that is already waiting for it.
+    """
+    interval = app.config['DASHBOARD_SNAPSHOT_INTERVAL']
+    while True:
+        changed = _changed.wait(interval)
+        _changed.clear()
+        with app.app_context():
+            try:
+                for location in app.config['LOCATIONS']:
+                    with use_location(location):
+                        if changed:
+                            get_snapshot()
+                        else:
+                            publish_snapshot()
+            except Exception:
+                logger.exception('Dashboard snapshot refresh failed')
+            finally:
+                db.session.remove()
+        if changed:
+            time.sleep(MIN_REBUILD_SECONDS)
+
+
+@click.command('materialize')
+@with_appcontext
+def materialize_command():
+    """Keep every location's dashboard snapshot fresh in the shared cache"""
+    app = current_app._get_current_object()
+    if app.config['CACHE_BACKEND'] != 'redis':
+        raise click.UsageError('Materializing needs CACHE_BACKEND=redis; with a per-process '
+                               'cache every worker builds its own snapshots on demand')
+    if app.config['DASHBOARD_SNAPSHOT_INTERVAL'] <= 0:
+        raise click.UsageError('DASHBOARD_SNAPSHOT_INTERVAL must be positive')
+    click.echo(f"Rebuilding dashboard snapshots every {app.config['DASHBOARD_SNAPSHOT_INTERVAL']}s, Ctrl+C to stop")
+    _materialize_loop(app)
+
+
+dashboard_cli = click.Group('dashboard', help='Staff dashboard snapshots.')
+dashboard_cli.add_command(materialize_command)
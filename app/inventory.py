@@ -0,0 +1,78 @@
+import logging
+from sqlalchemy import update, case, or_
+from app import db
+from app.models import MenuItem
+from app.catalog import invalidate_catalog
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStockError(Exception):
+    """Raised when a cart line can't be filled from current stock"""
+
+    def __init__(self, item_id, name):
+        super().__init__('{} is out of stock'.format(name))
+        self.item_id = item_id
+        self.name = name
+
+
+def reserve_stock(cart, strict=True):
+    """Decrement stock for every item in the cart inside the current transaction
+
+    Each line is a single conditional UPDATE, so concurrent checkouts can't
+    oversell and no row is read before it is written. Items whose stock is
+    NULL are untracked and only need to be available. An item that reaches
+    zero is marked unavailable in the same statement.
+
+    Returns the ids of items that sold out. Raises OutOfStockError if any
+    line can't be filled; the caller must roll back the session. With
+    strict=False unfillable lines are logged and skipped instead.
+    """
+    quantities = {}
+    names = {}
+    for cart_item in cart:
+        quantities[cart_item['id']] = quantities.get(cart_item['id'], 0) + cart_item['quantity']
+        names[cart_item['id']] = cart_item['name']
+
+    # Fixed lock order keeps concurrent multi-item checkouts from deadlocking
+    for item_id in sorted(quantities):
+        quantity = quantities[item_id]
+        result = db.session.execute(
+            update(MenuItem)
+            .where(
+                MenuItem.id == item_id,
+                MenuItem.available.is_(True),
+                or_(MenuItem.stock.is_(None), MenuItem.stock >= quantity)
+            )
+            .values(
+                stock=MenuItem.stock - quantity,
+                available=case((MenuItem.stock == quantity, False), else_=MenuItem.available)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            logger.info('Stock check failed for %s (ID: %s), wanted %d', names[item_id], item_id, quantity)
+            if strict:
+                raise OutOfStockError(item_id, names[item_id])
+
+    sold_out = [
+        item_id for (item_id,) in db.session.query(MenuItem.id).filter(
+            MenuItem.id.in_(list(quantities)),
+            MenuItem.stock == 0
+        )
+    ]
+    return sold_out
+
+
+def set_stock(item, stock):
+    """Set an item's stock level; None stops tracking stock for it"""
+    item.stock = stock
+    item.available = stock is None or stock > 0
+    logger.info('Stock for %s set to %s', item.name, 'untracked' if stock is None else stock)
+
+
+def after_checkout(sold_out):
+    """Refresh the catalog once a checkout that sold items out has committed"""
+    if sold_out:
+        logger.info('Items sold out: %s', sold_out)
+        invalidate_catalog()
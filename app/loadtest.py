@@ -0,0 +1,541 @@
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from http.cookiejar import CookieJar
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+MENU_ITEM_RE = re.compile(r'addToCart\((\d+)\)')
+OTP_RE = re.compile(r'class="otp-code">\s*(\d{6})')
+ORDER_PATH_RE = re.compile(r'/(order-success|api/track|manager/order)/(\d+)')
+ID_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+SEARCH_TERMS = ['chicken', 'combo', 'spicy', 'fries', 'wings', 'tea', 'mac']
+NEXT_STATUS = {'paid': 'preparing', 'preparing': 'ready', 'ready': 'completed'}
+
+# Session arrival rate multiplier over the run, x in [0, 1]
+ARRIVAL_CURVES = {
+    'constant': lambda x: 1.0,
+    'ramp': lambda x: max(x, 0.05),
+    # Quiet start, a lunch-rush style peak in the middle, tail off
+    'spike': lambda x: 0.2 + 0.8 * math.exp(-((x - 0.5) / 0.12) ** 2),
+    'wave': lambda x: 0.5 - 0.5 * math.cos(2 * math.pi * x * 2),
+}
+
+
+class Response:
+    def __init__(self, status, location, body):
+        self.status = status
+        self.location = location
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class TestClientSession:
+    """One virtual user talking to the app in-process"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self._client.open(path, method=method, data=data)
+        try:
+            return Response(response.status_code, response.headers.get('Location'), response.get_data())
+        finally:
+            response.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    """One virtual user talking to a running server, e.g. a local gunicorn"""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self._base_url + path, data=body, method=method)
+        try:
+            with self._opener.open(req, timeout=30) as response:
+                return Response(response.status, response.headers.get('Location'), response.read())
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.headers.get('Location'), e.read())
+
+
+def endpoint_label(method, path):
+    """'GET /api/track/<id>' style label for per-endpoint stats"""
+    return f"{method} {ID_SEGMENT_RE.sub('/<id>', path.split('?', 1)[0])}"
+
+
+class LoadStats:
+    """Thread-safe latency and error tallies per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.client_errors = {}
+        self.sessions = {'customer': 0, 'staff': 0}
+        self.orders = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, label, latency, status):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(latency)
+            if status is None or status >= 500:
+                self.errors[label] = self.errors.get(label, 0) + 1
+            elif status >= 400:
+                self.client_errors[label] = self.client_errors.get(label, 0) + 1
+
+    def count(self, key, amount=1):
+        with self._lock:
+            if key == 'orders':
+                self.orders += amount
+            else:
+                self.sessions[key] += amount
+
+    def report(self):
+        """Plain-text summary: throughput, error rate and latency percentiles"""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        total = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        lines = [
+            f'Duration {elapsed:.1f}s - {total} requests, {total / elapsed if elapsed else 0:.1f} req/s',
+            f"Sessions: {self.sessions['customer']} customer, {self.sessions['staff']} staff - {self.orders} orders placed",
+            f'Errors: {errors} ({100.0 * errors / total if total else 0:.2f}%), '
+            f'4xx: {sum(self.client_errors.values())}',
+            '',
+            f"{'endpoint':<40} {'count':>7} {'err':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}",
+        ]
+        for label in sorted(self.latencies):
+            values = sorted(self.latencies[label])
+            lines.append('{:<40} {:>7} {:>5} {:>8} {:>8} {:>8} {:>8}'.format(
+                label[:40], len(values), self.errors.get(label, 0),
+                *(f'{_percentile(values, p) * 1000:.1f}' for p in (50, 90, 99, 100))
+            ))
+        lines.append('(latencies in ms)')
+        return '\n'.join(lines)
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(math.ceil(percent / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+
+class TraceRecorder:
+    """Appends every request to a JSON-lines trace for later replay
+
+    Passwords are not written; replay takes them from the command line.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'w')
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def write(self, session_id, kind, method, path, data, response):
+        if data and 'password' in data:
+            data = dict(data, password=None)
+        entry = {
+            't': round(time.monotonic() - self._started, 4),
+            'session': session_id,
+            'kind': kind,
+            'method': method,
+            'path': path,
+            'data': data,
+            'status': response.status if response else None,
+            'location': response.location if response else None,
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class VirtualUser:
+    """A client session that times and records each request"""
+
+    def __init__(self, session, stats, recorder=None, session_id=None, kind='customer'):
+        self.session = session
+        self.stats = stats
+        self.recorder = recorder
+        self.session_id = session_id
+        self.kind = kind
+        self.otp = None
+
+    def request(self, method, path, data=None):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.session.request(method, path, data)
+        except Exception:
+            logger.exception('%s %s failed', method, path)
+        self.stats.record(endpoint_label(method, path), time.perf_counter() - started,
+                          response.status if response else None)
+        if self.recorder is not None:
+            self.recorder.write(self.session_id, self.kind, method, path, data, response)
+        if response is not None and method == 'GET' and path.startswith('/auth/verify-otp'):
+            match = OTP_RE.search(response.text)
+            self.otp = match.group(1) if match else None
+        return response
+
+    def login(self, email, password):
+        self.request('POST', '/auth/login', {'email': email, 'password': password})
+        self.request('GET', '/auth/verify-otp')
+        if not self.otp:
+            return False
+        response = self.request('POST', '/auth/verify-otp', {'otp': self.otp})
+        return response is not None and response.status == 302
+
+
+class LoadRunner:
+    """Drives customer and staff sessions against the app
+
+    Customer sessions arrive as a Poisson process whose rate follows
+    `curve` over the run, and run on a pool of `concurrency` threads.
+    Each browses, searches, fills a cart, checks out and polls tracking
+    every `poll_interval` seconds. Staff sessions log in once and keep
+    reloading the dashboard, polling its feeds and bumping order statuses
+    until the run ends. All think times are multiplied by `time_scale`.
+    """
+
+    def __init__(self, session_factory, stats, recorder=None, concurrency=20, duration=60,
+                 rate=1.0, curve='constant', staff=1, staff_credentials=None,
+                 poll_interval=5, polls=6, time_scale=1.0, seed=None):
+        self.session_factory = session_factory
+        self.stats = stats
+        self.recorder = recorder
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.curve = ARRIVAL_CURVES[curve]
+        self.staff = staff
+        self.staff_credentials = staff_credentials
+        self.poll_interval = poll_interval
+        self.polls = polls
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self._ids = iter(range(1, 1 << 30))
+        self._ids_lock = threading.Lock()
+        # Staff sessions share one account, and a new login replaces the
+        # previous one's pending OTP
+        self._login_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _user(self, kind):
+        with self._ids_lock:
+            session_id = next(self._ids)
+        return VirtualUser(self.session_factory(), self.stats, self.recorder, session_id, kind)
+
+    def _think(self, low, high):
+        self._stop.wait(self.random.uniform(low, high) * self.time_scale)
+
+    def arrivals(self):
+        """Session start offsets (seconds) for the run, by thinning a Poisson process"""
+        offsets = []
+        t = 0.0
+        while True:
+            t += self.random.expovariate(self.rate)
+            if t >= self.duration:
+                return offsets
+            if self.random.random() <= self.curve(t / self.duration):
+                offsets.append(t)
+
+    def customer_session(self):
+        user = self._user('customer')
+        self.stats.count('customer')
+
+        home = user.request('GET', '/')
+        self._think(1, 3)
+        menu = user.request('GET', '/menu')
+        item_ids = sorted({int(i) for i in MENU_ITEM_RE.findall(menu.text if menu else home.text if home else '')})
+        if self.random.random() < 0.5:
+            self._think(1, 3)
+            user.request('GET', '/api/menu/search?q=' + self.random.choice(SEARCH_TERMS))
+        if not item_ids:
+            return
+
+        for _ in range(self.random.randint(1, 4)):
+            self._think(0.5, 2)
+            user.request('POST', f'/cart/add/{self.random.choice(item_ids)}')
+        self._think(1, 3)
+        user.request('GET', '/cart')
+        user.request('GET', '/checkout')
+        self._think(5, 15)
+        response = user.request('POST', '/checkout', {
+            'name': f'Load Test {user.session_id}',
+            'email': f'load{user.session_id}@example.com',
+            'phone': '5550100'
+        })
+        match = ORDER_PATH_RE.search(response.location or '') if response is not None else None
+        if not match:
+            return
+        self.stats.count('orders')
+        order_id = match.group(2)
+        user.request('GET', f'/order-success/{order_id}')
+
+        for _ in range(self.polls):
+            self._stop.wait(self.poll_interval * self.time_scale)
+            response = user.request('GET', f'/api/track/{order_id}')
+            if response is None or response.status != 200 or response.json().get('status') == 'completed':
+                break
+
+    def staff_session(self):
+        user = self._user('staff')
+        self.stats.count('staff')
+        with self._login_lock:
+            logged_in = bool(self.staff_credentials) and user.login(*self.staff_credentials)
+        if not logged_in:
+            logger.warning('Staff session %s could not log in', user.session_id)
+            return
+
+        polls = 0
+        while not self._stop.is_set():
+            if polls % 6 == 0:
+                user.request('GET', '/manager')
+            user.request('GET', '/manager/api/stats')
+            feed = user.request('GET', '/manager/api/orders')
+            orders = feed.json() if feed is not None and feed.status == 200 else []
+            # Work the oldest active order forward one step
+            for order in reversed(orders):
+                if order['status'] in NEXT_STATUS:
+                    user.request('POST', f"/manager/order/{order['id']}/status",
+                                 {'status': NEXT_STATUS[order['status']]})
+                    break
+            polls += 1
+            self._stop.wait(self.poll_interval * self.time_scale)
+
+    def _safe(self, fn):
+        try:
+            fn()
+        except Exception:
+            logger.exception('Virtual user crashed')
+
+    def run(self):
+        """Run for `duration` seconds (plus draining sessions) and return the stats"""
+        staff_threads = [threading.Thread(target=self._safe, args=(self.staff_session,), daemon=True)
+                         for _ in range(self.staff)]
+        for thread in staff_threads:
+            thread.start()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='customer') as pool:
+            for offset in self.arrivals():
+                delay = started + offset * self.time_scale - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._safe, self.customer_session)
+        # Staff keep working until the last customer has finished
+        self._stop.set()
+
+        for thread in staff_threads:
+            thread.join()
+        self.stats.finished = time.monotonic()
+        return self.stats
+
+
+def replay_trace(path, session_factory, stats, speed=1.0, concurrency=50, staff_password=None):
+    """Re-issue a recorded trace with its original timing divided by `speed`
+
+    Each recorded session gets its own client so cookies carry over.
+    Order ids created during the replay are mapped from the recorded ones
+    via checkout redirects, and login OTPs are read fresh from the page.
+    """
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    sessions = {}
+    for entry in sorted(entries, key=lambda e: e['t']):
+        sessions.setdefault(entry['session'], []).append(entry)
+
+    id_map = {}
+    id_lock = threading.Lock()
+    started = time.monotonic()
+
+    def rewrite(path):
+        def swap(match):
+            with id_lock:
+                return f'/{match.group(1)}/{id_map.get(match.group(2), match.group(2))}'
+        return ORDER_PATH_RE.sub(swap, path)
+
+    def play(session_entries):
+        user = VirtualUser(session_factory(), stats, kind=session_entries[0]['kind'])
+        stats.count(user.kind)
+        for entry in session_entries:
+            delay = started + entry['t'] / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            data = entry['data']
+            if data and 'password' in data:
+                data = dict(data, password=staff_password)
+            if data and entry['path'].startswith('/auth/verify-otp'):
+                data = dict(data, otp=user.otp or '')
+            response = user.request(entry['method'], rewrite(entry['path']), data)
+
+            recorded = ORDER_PATH_RE.search(entry.get('location') or '')
+            replayed = ORDER_PATH_RE.search(response.location or '') if response is not None else None
+            if recorded and replayed and entry['path'] == '/checkout':
+                stats.count('orders')
+                with id_lock:
+                    id_map[recorded.group(2)] = replayed.group(2)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as pool:
+        for future in [pool.submit(play, session_entries) for session_entries in sessions.values()]:
+            future.result()
+    stats.finished = time.monotonic()
+    return stats
+
+
+def _session_factory(url):
+    if url:
+        return lambda: HttpSession(url)
+    app = current_app._get_current_object()
+    return lambda: TestClientSession(app)
+
+
+def _check_allow_writes(url, allow_writes):
+    if not url and not allow_writes:
+        raise click.UsageError(
+            'In-process runs place orders and create accounts in DATABASE_URL. '
+            'Point it at a scratch database and pass --allow-writes.'
+        )
+
+
+@contextmanager
+def _temporary_staff_users(emails, password):
+    """Create manager accounts for in-process staff sessions, deleted afterwards
+
+    Existing accounts are never modified; their passwords are unknown here,
+    so the caller has to pass --staff-password for them instead.
+    """
+    from app import db
+    from app.models import OTPToken, StaffClockIn, User
+    existing = sorted(email for email in emails if User.query.filter_by(email=email).first())
+    if existing:
+        raise click.UsageError(
+            f'Existing accounts are never modified ({", ".join(existing)}); '
+            'pass --staff-password to log in as them'
+        )
+
+    users = []
+    for email in sorted(emails):
+        user = User(email=email, name='Load Test', role='manager', email_verified=True)
+        user.set_password(password)
+        users.append(user)
+    db.session.add_all(users)
+    db.session.commit()
+    user_ids = [user.id for user in users]
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        OTPToken.query.filter(OTPToken.user_id.in_(user_ids)).delete(synchronize_session=False)
+        StaffClockIn.query.execution_options(all_locations=True).filter(
+            StaffClockIn.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        # Delete through the session so the user cache hears about it
+        for user in User.query.filter(User.id.in_(user_ids)):
+            db.session.delete(user)
+        db.session.commit()
+
+
+@click.command('run')
+@click.option('--url', help='Base URL of a running server; omit to drive the app in-process.')
+@click.option('--duration', default=60.0, show_default=True,
+              help='Simulated seconds over which sessions arrive (scaled by --time-scale).')
+@click.option('--rate', default=1.0, show_default=True, help='Peak customer sessions started per second.')
+@click.option('--curve', type=click.Choice(sorted(ARRIVAL_CURVES)), default='constant', show_default=True)
+@click.option('--concurrency', default=20, show_default=True, help='Maximum simultaneous customer sessions.')
+@click.option('--staff', default=1, show_default=True, help='Concurrent staff sessions.')
+@click.option('--staff-email', default='loadtest@example.com', show_default=True)
+@click.option('--staff-password', default=None, help='Required with --url; generated in-process.')
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds between tracking/dashboard polls.')
+@click.option('--polls', default=6, show_default=True, help='Tracking polls per customer after checkout.')
+@click.option('--time-scale', default=1.0, show_default=True, help='Multiplier for all waits, e.g. 0.1 for 10x faster.')
+@click.option('--record', type=click.Path(dir_okay=False), help='Write a replayable JSON-lines trace here.')
+@click.option('--seed', type=int, help='Random seed for a repeatable run.')
+@click.option('--allow-writes', is_flag=True, help='Confirm an in-process run may write to DATABASE_URL.')
+@with_appcontext
+def run_command(url, duration, rate, curve, concurrency, staff, staff_email, staff_password,
+                poll_interval, polls, time_scale, record, seed, allow_writes):
+    """Simulate customer and staff traffic and report latency and errors"""
+    _check_allow_writes(url, allow_writes)
+    staff_users = nullcontext()
+    if staff and not url and not staff_password:
+        staff_password = f'load-{random.getrandbits(64):x}'
+        staff_users = _temporary_staff_users({staff_email}, staff_password)
+    elif staff and not staff_password:
+        raise click.UsageError('--staff-password is required for staff sessions against --url')
+
+    recorder = TraceRecorder(record) if record else None
+    with staff_users:
+        runner = LoadRunner(
+            _session_factory(url), LoadStats(), recorder=recorder, concurrency=concurrency,
+            duration=duration, rate=rate, curve=curve, staff=staff,
+            staff_credentials=(staff_email, staff_password) if staff else None,
+            poll_interval=poll_interval, polls=polls, time_scale=time_scale, seed=seed
+        )
+        try:
+            stats = runner.run()
+        finally:
+            if recorder is not None:
+                recorder.close()
+    click.echo(stats.report())
+
+
+@click.command('replay')
+@click.argument('trace', type=click.Path(exists=True, dir_okay=False))
+@click.option('--url', help='Base URL of a running server; omit to drive the app in-process.')
+@click.option('--speed', default=1.0, show_default=True, help='Replay this many times faster than recorded.')
+@click.option('--concurrency', default=50, show_default=True, help='Maximum sessions replayed at once.')
+@click.option('--staff-password', default=None,
+              help='Password for recorded staff logins; required with --url. In-process '
+                   'runs without it create temporary accounts for them.')
+@click.option('--allow-writes', is_flag=True, help='Confirm an in-process replay may write to DATABASE_URL.')
+@with_appcontext
+def replay_command(trace, url, speed, concurrency, staff_password, allow_writes):
+    """Replay a trace recorded with `loadtest run --record`"""
+    _check_allow_writes(url, allow_writes)
+    staff_users = nullcontext()
+    if not url and not staff_password:
+        with open(trace) as f:
+            emails = {entry['data']['email'] for entry in map(json.loads, f)
+                      if entry['path'] == '/auth/login' and entry['data']}
+        staff_password = f'load-{random.getrandbits(64):x}'
+        staff_users = _temporary_staff_users(emails, staff_password)
+    with staff_users:
+        stats = replay_trace(trace, _session_factory(url), LoadStats(), speed=speed,
+                             concurrency=concurrency, staff_password=staff_password)
+    click.echo(stats.report())
+
+
+loadtest_cli = click.Group('loadtest', help='Synthetic traffic generator and trace replay.')
+loadtest_cli.add_command(run_command)
+loadtest_cli.add_command(replay_command)
@@ -0,0 +1,161 @@
+import logging
+from contextlib import contextmanager
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+from app.replica import replica_bind
+
+logger = logging.getLogger(__name__)
+
+# Rows created before locations existed belong here
+DEFAULT_LOCATION = 'main'
+
+
+def location_bind_key(location):
+    return f'location_{location}'
+
+
+def parse_location_databases(value):
+    """Parse 'slug=url,slug=url' into {slug: url}"""
+    databases = {}
+    for entry in (value or '').split(','):
+        if '=' not in entry:
+            continue
+        location, url = entry.split('=', 1)
+        databases[location.strip()] = url.strip()
+    return databases
+
+
+def get_locations():
+    return current_app.config['LOCATIONS']
+
+
+def current_location():
+    """Location the current request or use_location() block works against"""
+    if not has_app_context():
+        return DEFAULT_LOCATION
+    return g.get('location') or get_locations()[0]
+
+
+@contextmanager
+def use_location(location):
+    """Scope queries and new rows to `location` for the duration of the block"""
+    previous = g.get('location')
+    g.location = location
+    try:
+        yield
+    finally:
+        g.location = previous
+
+
+class LocationMixin:
+    """Adds the location column that queries are automatically scoped by"""
+    location = sa.Column(sa.String(32), nullable=False, default=current_location,
+                         server_default=DEFAULT_LOCATION)
+
+
+class LocationSession(Session):
+    """Session that sends location-bound models to their location's database
+
+    Models with `__location_bind__ = True` use the engine under the bind
+    key location_<slug> when one is configured. Everything else goes to
+    the default database, or to the read replica for SELECTs inside
+    replica_reads() (never while flushing).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None:
+            mapper = sa.inspect(mapper)
+            if getattr(mapper.class_, '__location_bind__', False):
+                engine = self._db.engines.get(location_bind_key(current_location()))
+                if engine is not None:
+                    return engine
+        if bind is None and not self._flushing:
+            engine = replica_bind(clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(LocationSession, 'do_orm_execute')
+def _scope_to_location(execute_state):
+    """Filter every ORM select/update/delete on a LocationMixin model
+
+    Pass execution_options(all_locations=True) to opt out, e.g. for
+    payroll that spans locations.
+    """
+    if execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    if execute_state.execution_options.get('all_locations', False):
+        return
+    location = current_location()
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(LocationMixin, lambda cls: cls.location == location, include_aliases=True)
+    )
+
+
+def location_engines(app):
+    """(location, engine) for every location with its own database"""
+    from app import db
+    engines = db.engines
+    return [(location, engines[location_bind_key(location)])
+            for location in app.config['LOCATIONS']
+            if location_bind_key(location) in engines]
+
+
+def database_locations(app):
+    """One location per database that can hold location-bound rows
+
+    Each location with its own database, plus the first location that
+    uses the default database (if any does). Querying under each of these
+    with all_locations=True covers every location's rows exactly once.
+    """
+    own = {location for location, _ in location_engines(app)}
+    shared = [location for location in app.config['LOCATIONS'] if location not in own]
+    return shared[:1] + [location for location in app.config['LOCATIONS'] if location in own]
+
+
+def configure_location_binds(app):
+    """Register a SQLAlchemy bind per location listed in LOCATION_DATABASES"""
+    databases = parse_location_databases(app.config['LOCATION_DATABASES'])
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for location, url in databases.items():
+        if location not in app.config['LOCATIONS']:
+            raise RuntimeError(f'LOCATION_DATABASES names unknown location {location!r}')
+        binds[location_bind_key(location)] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def create_location_tables(app):
+    """Create the location-bound tables in each per-location database"""
+    from app import db
+    tables = [mapper.local_table for mapper in db.Model.registry.mappers
+              if getattr(mapper.class_, '__location_bind__', False)]
+    for location, engine in location_engines(app):
+        db.metadata.create_all(bind=engine, tables=tables)
+        logger.info('Location %s uses its own database', location)
+
+
+def init_locations(app):
+    """Pick the location for each request and expose it to templates
+
+    `?location=<slug>` switches location and is remembered in the session;
+    switching empties the cart.
+    """
+    @app.before_request
+    def select_location():
+        locations = get_locations()
+        requested = request.args.get('location')
+        if requested in locations and requested != session.get('location'):
+            session['location'] = requested
+            # Menu item ids differ between locations
+            session.pop('cart', None)
+        location = session.get('location')
+        g.location = location if location in locations else locations[0]
+
+    app.jinja_env.globals['current_location'] = current_location
+    app.jinja_env.globals['get_locations'] = get_locations
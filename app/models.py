@@ -2,14 +2,40 @@ from datetime import datetime
 import logging
 import bcrypt
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
 from app import db, login_manager
+from app.cache import Cache, invalidate_tags
+from app.locations import LocationMixin
 
 logger = logging.getLogger(__name__)
 
+user_cache = Cache('user', 'CACHE_USER_TTL')
+
+
+# Never cached: with a shared backend the hash would sit in Redis. The
+# cached login user leaves it unloaded and check_password() loads it.
+UNCACHED_USER_COLUMNS = {'password_hash'}
+
+
+def _user_columns(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns
+            if column.key not in UNCACHED_USER_COLUMNS}
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Rebuild the logged-in user from cached columns without a query"""
+    user_id = int(user_id)
+    columns = user_cache.get_or_load(user_id, lambda: _user_columns(user_id), tags=[f'user:{user_id}'])
+    if columns is None:
+        return None
+    user = User(**columns)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 
 class User(UserMixin, db.Model):
@@ -31,6 +57,7 @@ class User(UserMixin, db.Model):
         ).decode('utf-8')
 
     def check_password(self, password):
+        # Loads the hash from the database if this is the cached login user
         return bcrypt.checkpw(
             password.encode('utf-8'), 
             self.password_hash.encode('utf-8')
@@ -40,6 +67,12 @@ class User(UserMixin, db.Model):
         return self.role in ['staff', 'manager', 'admin']
 
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_tags(f'user:{target.id}', session=object_session(target))
+
+
 class StaffCode(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(50), unique=True, nullable=False)
@@ -58,27 +91,34 @@ class OTPToken(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
-class MenuItem(db.Model):
+class MenuItem(LocationMixin, db.Model):
+    __location_bind__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False, server_default='0')
     image_url = db.Column(db.String(500))
     category = db.Column(db.String(50))
     popular = db.Column(db.Boolean, default=False)
     spicy = db.Column(db.Boolean, default=False)
     available = db.Column(db.Boolean, default=True)
+    stock = db.Column(db.Integer, nullable=True)  # None = not tracked
+
+    __table_args__ = (db.Index('ix_menu_item_location_available', 'location', 'available'),)
 
 
-class Order(db.Model):
+class Order(LocationMixin, db.Model):
+    __location_bind__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(20), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     customer_name = db.Column(db.String(100), nullable=False)
-    customer_email = db.Column(db.String(120))
-    customer_phone = db.Column(db.String(20))
+    customer_email = db.Column(db.String(120), index=True)
+    customer_phone = db.Column(db.String(20), index=True)
     status = db.Column(db.String(20), default='pending')
-    total = db.Column(db.Float, nullable=False)
+    total_cents = db.Column(db.Integer, nullable=False, server_default='0')
     payment_id = db.Column(db.String(100))
     payment_status = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -90,9 +130,35 @@ class Order(db.Model):
     ready_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     estimated_ready_minutes = db.Column(db.Integer, default=15)
+    pickup_at = db.Column(db.DateTime)  # start of the kitchen slot the order was admitted into
+
+    # Denormalized at checkout so order lists never need to load items
+    item_count = db.Column(db.Integer)
+    items_summary = db.Column(db.String(255))
+
+    # Idempotency key for orders replayed from an offline terminal journal
+    source_key = db.Column(db.String(64))
 
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     tracking_events = db.relationship('OrderTracking', backref='order', lazy=True, cascade='all, delete-orphan', order_by='OrderTracking.created_at')
+
+    __table_args__ = (
+        # Keyset pagination for a location's order history, with and without a status filter
+        db.Index('ix_order_location_created_at_id', 'location', 'created_at', 'id'),
+        db.Index('ix_order_location_status_created_at_id', 'location', 'status', 'created_at', 'id'),
+        # Customer order history
+        db.Index('ix_order_user_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_source_key', 'source_key', unique=True),
+    )
+
+    def set_item_summary(self, lines):
+        """Store item count and a short item list from (name, quantity) pairs"""
+        lines = list(lines)
+        self.item_count = sum(quantity for _, quantity in lines)
+        summary = ', '.join(f'{quantity}× {name}' for name, quantity in lines[:3])
+        if len(lines) > 3:
+            summary += f' +{len(lines) - 3} more'
+        self.items_summary = summary[:255]
     
     def update_status(self, new_status, notes=None):
         """Update order status with timestamp tracking"""
@@ -118,7 +184,7 @@ class Order(db.Model):
         )
         db.session.add(tracking)
         
-        logger.info(f'Order {self.order_number} status changed: {old_status} -> {new_status}')
+        logger.info('Order %s status changed: %s -> %s', self.order_number, old_status, new_status)
         return tracking
     
     def get_elapsed_time(self):
@@ -147,6 +213,7 @@ class Order(db.Model):
             'progress': self.get_progress_percentage(),
             'elapsed_seconds': self.get_elapsed_time(),
             'estimated_ready_minutes': self.estimated_ready_minutes,
+            'pickup_at': self.pickup_at.isoformat() if self.pickup_at else None,
             'created_at': self.created_at.isoformat(),
             'paid_at': self.paid_at.isoformat() if self.paid_at else None,
             'preparing_at': self.preparing_at.isoformat() if self.preparing_at else None,
@@ -157,16 +224,20 @@ class Order(db.Model):
 
 
 class OrderItem(db.Model):
+    __location_bind__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     menu_item_id = db.Column(db.Integer, nullable=False)
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False, server_default='0')
     quantity = db.Column(db.Integer, default=1)
 
 
 class OrderTracking(db.Model):
     """Tracks order status changes with timestamps for real-time tracking"""
+    __location_bind__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     status = db.Column(db.String(20), nullable=False)
@@ -185,16 +256,21 @@ class OrderTracking(db.Model):
         return f'<OrderTracking {self.order_id}: {self.status}>'
 
 
-class StaffClockIn(db.Model):
+class StaffClockIn(LocationMixin, db.Model):
     """Tracks staff clock in/out times"""
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     clock_in = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    clock_out = db.Column(db.DateTime, nullable=True)
+    clock_out = db.Column(db.DateTime, nullable=True, index=True)
     break_minutes = db.Column(db.Integer, default=0)
     notes = db.Column(db.String(255))
     
     user = db.relationship('User', backref='clock_records')
+
+    __table_args__ = (
+        db.Index('ix_staff_clock_in_user_clock_in', 'user_id', 'clock_in'),
+        db.Index('ix_staff_clock_in_location_clock_in', 'location', 'clock_in'),
+    )
     
     @property
     def is_active(self):
@@ -202,10 +278,15 @@ class StaffClockIn(db.Model):
     
     @property
     def hours_worked(self):
-        end_time = self.clock_out or datetime.utcnow()
-        delta = end_time - self.clock_in
+        return self.hours_between(self.clock_in, self.clock_out, self.break_minutes)
+
+    @staticmethod
+    def hours_between(clock_in, clock_out, break_minutes):
+        """Hours worked for a shift; an open shift counts up to now"""
+        end_time = clock_out or datetime.utcnow()
+        delta = end_time - clock_in
         hours = delta.total_seconds() / 3600
-        return round(hours - (self.break_minutes / 60), 2)
+        return round(hours - (break_minutes / 60), 2)
     
     def to_dict(self):
         return {
@@ -219,13 +300,34 @@ class StaffClockIn(db.Model):
         }
 
 
-class DailySales(db.Model):
+class TimesheetDay(db.Model):
+    """Marks a day whose per-staff hours are frozen in TimesheetRollup"""
+    day = db.Column(db.Date, primary_key=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class TimesheetRollup(db.Model):
+    """Hours worked by one staff member on one closed day"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    worked_seconds = db.Column(db.Integer, default=0)
+    break_minutes = db.Column(db.Integer, default=0)
+    shifts = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.UniqueConstraint('day', 'user_id'),)
+
+
+class DailySales(LocationMixin, db.Model):
     """Daily sales summary for analytics"""
+    __location_bind__ = True
+
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, unique=True, nullable=False)
+    date = db.Column(db.Date, nullable=False)
     total_orders = db.Column(db.Integer, default=0)
-    total_revenue = db.Column(db.Float, default=0)
-    avg_order_value = db.Column(db.Float, default=0)
+    total_revenue_cents = db.Column(db.Integer, default=0, server_default='0')
+    avg_order_value_cents = db.Column(db.Integer, default=0, server_default='0')
     top_item = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.UniqueConstraint('location', 'date'),)
@@ -0,0 +1,41 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Prices and totals are integer cents everywhere: in the database, the
+# catalog, carts and the offline journal. Dollars only appear at the edges,
+# when reading a price typed by a person or displaying one.
+
+
+def to_cents(amount):
+    """Dollars (str, Decimal, int or float) to integer cents, rounding half up"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_dollars(cents):
+    """Exact Decimal dollars for integer cents"""
+    return Decimal(cents or 0).scaleb(-2)
+
+
+def format_money(cents, places=2):
+    """'12.50' for 1250; templates add the currency sign"""
+    return str(to_dollars(cents).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP))
+
+
+def line_total(item):
+    return item['price_cents'] * item['quantity']
+
+
+def cart_total(cart):
+    """Total of a cart in cents"""
+    return sum(line_total(item) for item in cart)
+
+
+def cart_in_cents(cart):
+    """Convert cart lines saved with float 'price' dollars to 'price_cents'
+
+    Session carts and journaled offline orders from before the move to
+    cents carry the old key.
+    """
+    for item in cart:
+        if 'price_cents' not in item:
+            item['price_cents'] = to_cents(item.pop('price'))
+    return cart
@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from app import db
+from app.locations import DEFAULT_LOCATION, current_location, use_location
+from app.models import Order
+from app.orders import place_order, generate_order_number
+from app.money import cart_in_cents
+from app.inventory import after_checkout
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_key TEXT NOT NULL UNIQUE,
+    order_number TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    synced_at TEXT,
+    synced_order_number TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_journal_pending ON journal (synced_at, id);
+'''
+
+
+class OrderJournal:
+    """Local SQLite journal of orders captured while the main DB is unreachable
+
+    Uses the stdlib sqlite3 driver on its own file so it keeps working
+    whatever happens to the main database connection. Entries that failed
+    to sync `max_attempts` times on their own are quarantined: no longer
+    pending until reset_failed() puts them back.
+    """
+
+    def __init__(self, path, max_attempts=5):
+        self.path = path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(JOURNAL_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, cart, customer, user_id=None):
+        """Journal an order and return (source_key, order_number)"""
+        source_key = uuid.uuid4().hex
+        order_number = generate_order_number()
+        payload = json.dumps({'cart': cart, 'customer': customer, 'user_id': user_id,
+                              'location': current_location()})
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO journal (source_key, order_number, payload, created_at) VALUES (?, ?, ?, ?)',
+                (source_key, order_number, payload, datetime.utcnow().isoformat())
+            )
+        return source_key, order_number
+
+    def pending(self, limit, after_id=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, source_key, order_number, payload, created_at FROM journal '
+                'WHERE synced_at IS NULL AND attempts < ? AND id > ? ORDER BY id LIMIT ?',
+                (self.max_attempts, after_id, limit)
+            ).fetchall()
+        return [{
+            'id': row[0],
+            'source_key': row[1],
+            'order_number': row[2],
+            'payload': json.loads(row[3]),
+            'created_at': datetime.fromisoformat(row[4])
+        } for row in rows]
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM journal WHERE synced_at IS NULL AND attempts < ?',
+                (self.max_attempts,)
+            ).fetchone()[0]
+
+    def failed_count(self):
+        """Entries quarantined after failing max_attempts times"""
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM journal WHERE synced_at IS NULL AND attempts >= ?',
+                (self.max_attempts,)
+            ).fetchone()[0]
+
+    def reset_failed(self):
+        """Make quarantined entries pending again, e.g. after fixing what broke them"""
+        with self._connect() as conn:
+            return conn.execute(
+                'UPDATE journal SET attempts = 0 WHERE synced_at IS NULL AND attempts >= ?',
+                (self.max_attempts,)
+            ).rowcount
+
+    def mark_synced(self, entries):
+        """Record which main-DB order number each entry ended up with"""
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE journal SET synced_at = ?, synced_order_number = ? WHERE id = ?',
+                [(now, order_number, entry_id) for entry_id, order_number in entries]
+            )
+
+    def mark_failed(self, entry_ids, error):
+        """Count a failed attempt; the entry is quarantined after max_attempts"""
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE id = ?',
+                [(str(error)[:500], entry_id) for entry_id in entry_ids]
+            )
+
+
+class PrimaryStatus:
+    """Circuit breaker for the main database
+
+    After a connection failure checkout skips the main DB for
+    OFFLINE_RETRY_SECONDS and journals straight away, instead of waiting
+    on a dead connection for every order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def is_offline(self):
+        return time.monotonic() < self._retry_at
+
+    def mark_offline(self, retry_seconds):
+        with self._lock:
+            self._retry_at = time.monotonic() + retry_seconds
+        logger.warning('Main database unreachable, journaling orders for %ss', retry_seconds)
+
+    def mark_online(self):
+        with self._lock:
+            if self._retry_at:
+                logger.info('Main database reachable again')
+            self._retry_at = 0.0
+
+
+primary = PrimaryStatus()
+_journal = None
+
+
+def get_journal():
+    """The configured journal, or None when offline capture is disabled"""
+    return _journal
+
+
+def init_offline(app):
+    """Open the journal and start the background sync thread if configured
+
+    The thread only runs with OFFLINE_SYNC_THREAD set, which belongs on a
+    single process. Otherwise `flask offline watch` does the syncing, so
+    web workers and CLI commands don't each start their own.
+    """
+    global _journal
+    path = app.config.get('OFFLINE_JOURNAL_PATH')
+    if not path:
+        _journal = None
+        return
+    _journal = OrderJournal(path, app.config['OFFLINE_SYNC_MAX_ATTEMPTS'])
+    app.cli.add_command(offline_cli)
+    if app.config['OFFLINE_SYNC_THREAD'] and app.config['OFFLINE_SYNC_INTERVAL'] > 0:
+        thread = threading.Thread(target=_sync_loop, args=(app,), name='offline-sync', daemon=True)
+        thread.start()
+
+
+def sync_journal(journal, batch_size=50):
+    """Replay pending journal entries into the main DB in batches
+
+    Each batch commits in one transaction. Entries carry a source_key that
+    is stored on the order, so a batch that committed but wasn't marked in
+    the journal is recognised and skipped on the next run. If a journaled
+    order_number is already taken by a different order, the replay gets a
+    fresh number. Each location's entries are replayed into that location.
+    Every pending entry is tried at most once per call. Returns the number
+    of entries synced.
+    """
+    synced_total = 0
+    last_id = 0
+    while True:
+        entries = journal.pending(batch_size, after_id=last_id)
+        if not entries:
+            break
+        last_id = entries[-1]['id']
+
+        by_location = {}
+        for entry in entries:
+            location = entry['payload'].get('location') or DEFAULT_LOCATION
+            by_location.setdefault(location, []).append(entry)
+        for location, location_entries in by_location.items():
+            with use_location(location):
+                synced_total += _sync_batch(journal, location_entries)
+
+    return synced_total
+
+
+def _sync_batch(journal, entries):
+    """Replay one location's entries in a single transaction
+
+    If the batch fails for any reason other than the database being
+    unreachable, its entries are replayed one at a time so one bad entry
+    can't hold back the rest. An entry that fails on its own has the
+    attempt counted in the journal.
+    """
+    try:
+        results, sold_out = _replay(entries)
+        db.session.commit()
+    except (OperationalError, InterfaceError):
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        if len(entries) == 1:
+            journal.mark_failed([entries[0]['id']], e)
+            logger.exception('Journaled order %s failed to sync', entries[0]['order_number'])
+            return 0
+        results = None
+
+    if results is None:
+        logger.warning('Replaying a failed batch of %d journaled orders one at a time', len(entries))
+        return sum(_sync_batch(journal, [entry]) for entry in entries)
+
+    journal.mark_synced(results)
+    after_checkout(sold_out)
+    logger.info('Synced %d journaled orders', len(results))
+    return len(results)
+
+
+def _replay(entries):
+    """Add the orders for `entries` to the session without committing
+
+    Returns ([(entry id, order number)], sold_out_item_ids).
+    """
+    keys = [entry['source_key'] for entry in entries]
+    numbers = [entry['order_number'] for entry in entries]
+    applied = {
+        o.source_key: o.order_number
+        for o in Order.query.with_entities(Order.source_key, Order.order_number)
+        .filter(Order.source_key.in_(keys))
+    }
+    # Order numbers are unique across every location sharing a database
+    taken = {
+        number for (number,) in db.session.query(Order.order_number)
+        .execution_options(all_locations=True)
+        .filter(Order.order_number.in_(numbers))
+    }
+
+    results = []
+    sold_out = []
+    for entry in entries:
+        if entry['source_key'] in applied:
+            results.append((entry['id'], applied[entry['source_key']]))
+            continue
+
+        order_number = entry['order_number']
+        if order_number in taken:
+            order_number = generate_order_number()
+            logger.warning('Order number %s already used, replaying as %s',
+                           entry['order_number'], order_number)
+
+        payload = entry['payload']
+        order, item_sold_out = place_order(
+            cart_in_cents(payload['cart']),
+            payload['customer'],
+            user_id=payload.get('user_id'),
+            order_number=order_number,
+            created_at=entry['created_at'],
+            payment_status='offline',
+            source_key=entry['source_key'],
+            strict_stock=False
+        )
+        sold_out.extend(item_sold_out)
+        taken.add(order_number)
+        results.append((entry['id'], order_number))
+
+    return results, sold_out
+
+
+def _sync_loop(app):
+    interval = app.config['OFFLINE_SYNC_INTERVAL']
+    batch_size = app.config['OFFLINE_SYNC_BATCH_SIZE']
+    while True:
+        time.sleep(interval)
+        if _journal is None:
+            continue
+        with app.app_context():
+            try:
+                if _journal.pending_count():
+                    sync_journal(_journal, batch_size)
+                    primary.mark_online()
+            except DBAPIError:
+                logger.info('Journal sync deferred, main database still unreachable')
+            except Exception:
+                # Keep the thread alive; the journal still holds every entry
+                logger.exception('Journal sync failed, retrying in %ss', interval)
+            finally:
+                db.session.remove()
+
+
+@click.command('sync')
+@click.option('--retry-failed', is_flag=True, help='Retry entries quarantined after repeated failures.')
+@with_appcontext
+def sync_command(retry_failed):
+    """Push journaled offline orders to the main database"""
+    journal = get_journal()
+    if retry_failed:
+        click.echo(f'Retrying {journal.reset_failed()} quarantined orders')
+    count = sync_journal(journal, current_app.config['OFFLINE_SYNC_BATCH_SIZE'])
+    click.echo(f'Synced {count} orders, {journal.pending_count()} pending, '
+               f'{journal.failed_count()} quarantined')
+
+
+@click.command('watch')
+@with_appcontext
+def watch_command():
+    """Keep syncing journaled orders every OFFLINE_SYNC_INTERVAL seconds"""
+    interval = current_app.config['OFFLINE_SYNC_INTERVAL']
+    if interval <= 0:
+        raise click.UsageError('OFFLINE_SYNC_INTERVAL must be positive')
+    click.echo(f'Syncing the journal every {interval}s, Ctrl+C to stop')
+    _sync_loop(current_app._get_current_object())
+
+
+offline_cli = click.Group('offline', help='Offline order journal.')
+offline_cli.add_command(sync_command)
+offline_cli.add_command(watch_command)
@@ -0,0 +1,142 @@
+import logging
+import random
+import string
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+from app.cache import Cache, invalidate_tags
+from app.locations import current_location, get_locations, use_location
+from app.money import cart_total
+from app.models import Order, OrderItem, OrderTracking
+from app.inventory import reserve_stock
+
+logger = logging.getLogger(__name__)
+
+tracking_cache = Cache('tracking', 'CACHE_TRACKING_TTL')
+
+
+def order_tag(order_id, location=None):
+    return f'order:{location or current_location()}:{order_id}'
+
+
+def generate_order_number():
+    return 'ORD-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+
+def place_order(cart, customer, user_id=None, pickup_at=None, order_number=None,
+                created_at=None, payment_status='dev_mode', source_key=None, strict_stock=True):
+    """Create a paid order with its items and first tracking event
+
+    Reserves stock, then adds everything to the session without
+    committing. Cart lines carry price_cents; `customer` holds name, email
+    and phone. Raises OutOfStockError unless strict_stock is False, which
+    is for orders that were already promised to a customer (offline
+    replays).
+
+    Returns (order, sold_out_item_ids).
+    """
+    sold_out = reserve_stock(cart, strict=strict_stock)
+
+    created_at = created_at or datetime.utcnow()
+    order = Order(
+        order_number=order_number or generate_order_number(),
+        user_id=user_id,
+        customer_name=customer['name'],
+        customer_email=customer.get('email'),
+        customer_phone=customer.get('phone'),
+        total_cents=cart_total(cart),
+        status='paid',
+        payment_status=payment_status,
+        pickup_at=pickup_at,
+        source_key=source_key,
+        created_at=created_at,
+        paid_at=created_at
+    )
+    if pickup_at is not None:
+        order.estimated_ready_minutes = max(
+            current_app.config['KITCHEN_LEAD_MINUTES'],
+            int((pickup_at - created_at).total_seconds() // 60)
+        )
+    order.set_item_summary((cart_item['name'], cart_item['quantity']) for cart_item in cart)
+    db.session.add(order)
+    db.session.flush()
+
+    # Create initial tracking event
+    db.session.add(OrderTracking(
+        order_id=order.id,
+        status='paid',
+        notes='Order received and payment confirmed',
+        created_at=created_at
+    ))
+
+    for cart_item in cart:
+        db.session.add(OrderItem(
+            order_id=order.id,
+            menu_item_id=cart_item['id'],
+            name=cart_item['name'],
+            price_cents=cart_item['price_cents'],
+            quantity=cart_item['quantity']
+        ))
+
+    return order, sold_out
+
+
+def _load_tracking(order_id):
+    order = db.session.get(Order, order_id)
+    return order.to_tracking_dict() if order is not None else None
+
+
+def get_tracking(order_id, location=None):
+    """Tracking payload for an order in `location` (default: current), or None
+
+    Payloads are cached until the order or its tracking events change;
+    only elapsed_seconds is recomputed on every call.
+    """
+    location = location or current_location()
+
+    def load():
+        with use_location(location):
+            return _load_tracking(order_id)
+
+    payload = tracking_cache.get_or_load(
+        (location, order_id),
+        load,
+        tags=[order_tag(order_id, location)]
+    )
+    if payload is None:
+        return None
+    created_at = datetime.fromisoformat(payload['created_at'])
+    return dict(payload, elapsed_seconds=int((datetime.utcnow() - created_at).total_seconds()))
+
+
+def _find_order(order_number):
+    current = current_location()
+    for location in [current] + [loc for loc in get_locations() if loc != current]:
+        with use_location(location):
+            order_id = db.session.query(Order.id).filter_by(order_number=order_number).scalar()
+        if order_id is not None:
+            return location, order_id
+    return None
+
+
+def find_order(order_number):
+    """(location, id) of the order with this number in any location, or None
+
+    Tracking links are shared and bookmarked, so they have to work whatever
+    location the visitor's session is on. The current location is tried
+    first.
+    """
+    return tracking_cache.get_or_load(('number', order_number), lambda: _find_order(order_number))
+
+
+@event.listens_for(Order, 'after_update')
+@event.listens_for(Order, 'after_delete')
+def _order_changed(mapper, connection, target):
+    invalidate_tags(order_tag(target.id, target.location), session=object_session(target))
+
+
+@event.listens_for(OrderTracking, 'after_insert')
+def _tracking_added(mapper, connection, target):
+    invalidate_tags(order_tag(target.order_id), session=object_session(target))
@@ -0,0 +1,44 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_, literal
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor pointing just past (created_at, id)"""
+    raw = f'{created_at.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; returns None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def keyset_page(query, created_col, id_col, cursor=None, limit=25):
+    """Fetch one page of `query` newest first, seeking past `cursor`
+
+    The (created_col, id_col) pair must be backed by an index so every page
+    is an index range scan, however deep into the table it starts.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, row_id = position
+        query = query.filter(
+            tuple_(created_col, id_col) < tuple_(literal(created_at, created_col.type), literal(row_id, id_col.type))
+        )
+
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
@@ -0,0 +1,85 @@
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+STICKY_SESSION_KEY = '_primary_until'
+
+
+def init_replica(app, db):
+    """Create the read replica engine if one is configured
+
+    REPLICA_DATABASE_URL points at a real replica. Failing that, with
+    SQLITE_WAL_READ_POOL a SQLite database is switched to WAL mode and a
+    second, read-only connection pool is opened on the same file, so
+    dashboard reads never wait behind checkout writes.
+    """
+    url = app.config['REPLICA_DATABASE_URL']
+    if not url and app.config['SQLITE_WAL_READ_POOL'] and db.engine.dialect.name == 'sqlite':
+        path = db.engine.url.database
+        if path and path != ':memory:':
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+            url = f'sqlite:///file:{path}?mode=ro&uri=true'
+    if not url:
+        app.extensions['replica'] = None
+        return
+
+    app.extensions['replica'] = sa.create_engine(url, pool_pre_ping=True)
+    app.after_request(_stick_to_primary)
+    logger.info('Read replica enabled (%s)', app.extensions['replica'].url.render_as_string(hide_password=True))
+
+
+def replica_bind(clause):
+    """The replica engine if this statement may read from it, else None"""
+    if not has_app_context() or not g.get('replica_reads'):
+        return None
+    if not getattr(clause, 'is_select', False):
+        return None
+    return current_app.extensions.get('replica')
+
+
+def _recently_wrote():
+    return has_request_context() and session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+@contextmanager
+def replica_reads():
+    """Send SELECTs in this block to the replica
+
+    Clients that wrote within REPLICA_STICKY_SECONDS keep reading from the
+    primary so they always see their own changes.
+    """
+    previous = g.get('replica_reads', False)
+    g.replica_reads = not _recently_wrote()
+    try:
+        yield
+    finally:
+        g.replica_reads = previous
+
+
+def read_replica(f):
+    """Serve a read-only view from the replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with replica_reads():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_write(db_session, flush_context):
+    if has_request_context():
+        g.wrote_primary = True
+
+
+def _stick_to_primary(response):
+    if g.get('wrote_primary'):
+        session[STICKY_SESSION_KEY] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
@@ -1,52 +1,69 @@
 import logging
-from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify
-from flask_login import current_user
-import random
-import string
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, current_app, abort
+from flask_login import current_user, login_required
+from sqlalchemy.exc import InterfaceError, OperationalError
+from datetime import datetime
 from app import db
-from app.models import MenuItem, Order, OrderItem, OrderTracking
+from app.models import MenuItem, Order
+from app.catalog import get_catalog_item
+from app.inventory import after_checkout, OutOfStockError
+from app.capacity import kitchen, KitchenFullError
+from app.orders import place_order, get_tracking, find_order
+from app.money import cart_in_cents, cart_total, format_money
+from app.locations import database_locations, get_locations, use_location
+from app.offline import get_journal, primary
+from app.pagination import encode_cursor, keyset_page
+from app.replica import read_replica
 
 logger = logging.getLogger(__name__)
 
 cart_bp = Blueprint('cart', __name__)
 
+MY_ORDERS_PAGE_SIZE = 100
 
-def generate_order_number():
-    return 'ORD-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+def get_cart():
+    """The session cart, with lines from before prices were in cents converted"""
+    return cart_in_cents(session.get('cart', []))
 
 
 @cart_bp.route('/cart/add/<int:item_id>', methods=['POST'])
 def add_to_cart(item_id):
-    item = MenuItem.query.get_or_404(item_id)
-    cart = session.get('cart', [])
+    # Served from the catalog snapshot so carts keep working while the DB is down
+    item = get_catalog_item(item_id)
+    if item is None:
+        unavailable = MenuItem.query.get_or_404(item_id)
+        logger.info('Add to cart rejected, %s is unavailable', unavailable.name)
+        return jsonify({'success': False, 'error': f'{unavailable.name} is sold out'}), 409
+    cart = get_cart()
     
-    logger.debug(f'Adding item {item.name} (ID: {item_id}) to cart')
+    logger.debug('Adding item %s (ID: %s) to cart', item['name'], item_id)
 
     for cart_item in cart:
         if cart_item['id'] == item_id:
             cart_item['quantity'] += 1
             session['cart'] = cart
-            logger.info(f'Cart updated: {item.name} quantity increased to {cart_item["quantity"]}')
+            logger.info('Cart updated: %s quantity increased to %s', item['name'], cart_item['quantity'])
             return jsonify({'success': True, 'cart_count': sum(i['quantity'] for i in cart)})
 
     cart.append({
-        'id': item.id,
-        'name': item.name,
-        'price': item.price,
-        'image_url': item.image_url,
+        'id': item['id'],
+        'name': item['name'],
+        'price_cents': item['price_cents'],
+        'image_url': item['image_url'],
         'quantity': 1
     })
     session['cart'] = cart
     
-    logger.info(f'New item added to cart: {item.name} - ${item.price}')
+    logger.info('New item added to cart: %s - $%s', item['name'], format_money(item['price_cents']))
 
     return jsonify({'success': True, 'cart_count': sum(i['quantity'] for i in cart)})
 
 
 @cart_bp.route('/cart')
 def view_cart():
-    cart = session.get('cart', [])
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    cart = get_cart()
+    total = cart_total(cart)
     cart_count = sum(item['quantity'] for item in cart)
     return render_template('cart.html', cart=cart, total=total, cart_count=cart_count)
 
@@ -54,7 +71,7 @@ def view_cart():
 @cart_bp.route('/cart/update/<int:item_id>', methods=['POST'])
 def update_cart(item_id):
     quantity = int(request.form.get('quantity', 0))
-    cart = session.get('cart', [])
+    cart = get_cart()
 
     if quantity <= 0:
         cart = [item for item in cart if item['id'] != item_id]
@@ -70,90 +87,186 @@ def update_cart(item_id):
 
 @cart_bp.route('/checkout', methods=['GET', 'POST'])
 def checkout():
-    cart = session.get('cart', [])
+    cart = get_cart()
     if not cart:
         logger.info('Checkout attempted with empty cart')
         return redirect(url_for('main.home'))
 
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    total = cart_total(cart)
 
     if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        phone = request.form.get('phone')
-        
-        logger.info(f'Processing checkout for {name} ({email})')
-
-        order = Order(
-            order_number=generate_order_number(),
-            user_id=current_user.id if current_user.is_authenticated else None,
-            customer_name=name,
-            customer_email=email,
-            customer_phone=phone,
-            total=total,
-            status='paid',
-            payment_status='dev_mode'
-        )
-        db.session.add(order)
-        db.session.flush()
+        customer = {
+            'name': request.form.get('name'),
+            'email': request.form.get('email'),
+            'phone': request.form.get('phone')
+        }
+        user_id = current_user.id if current_user.is_authenticated else None
         
-        # Create initial tracking event
-        initial_tracking = OrderTracking(
-            order_id=order.id,
-            status='paid',
-            notes='Order received and payment confirmed'
-        )
-        db.session.add(initial_tracking)
-        order.paid_at = order.created_at
-
-        for cart_item in cart:
-            order_item = OrderItem(
-                order_id=order.id,
-                menu_item_id=cart_item['id'],
-                name=cart_item['name'],
-                price=cart_item['price'],
-                quantity=cart_item['quantity']
-            )
-            db.session.add(order_item)
-
-        db.session.commit()
+        logger.info('Processing checkout for %s (%s)', customer['name'], customer['email'])
+
+        journal = get_journal()
+        if journal is not None and primary.is_offline():
+            return queue_offline_order(journal, cart, customer, user_id)
+
+        try:
+            requested_slot = datetime.fromisoformat(request.form.get('pickup_slot', ''))
+        except ValueError:
+            requested_slot = None
+
+        pickup_at = None
+        try:
+            pickup_at = kitchen.admit(requested_slot)
+            order, sold_out = place_order(cart, customer, user_id=user_id, pickup_at=pickup_at)
+            db.session.commit()
+        except KitchenFullError as e:
+            cart_count = sum(item['quantity'] for item in cart)
+            if e.offer is None:
+                flash("We're at kitchen capacity right now. Please try again in a few minutes.", 'error')
+            return render_template('checkout.html', cart=cart, total=total, cart_count=cart_count,
+                                   form=request.form, offered_slot=e.offer)
+        except OutOfStockError as e:
+            db.session.rollback()
+            kitchen.release(pickup_at)
+            flash(f'Sorry, {e.name} just sold out. Please update your cart.', 'error')
+            return redirect(url_for('cart.view_cart'))
+        except (OperationalError, InterfaceError):
+            # The database is unreachable; journal the order if we can
+            db.session.rollback()
+            kitchen.release(pickup_at)
+            if journal is None:
+                raise
+            logger.exception('Checkout failed against the main database')
+            primary.mark_offline(current_app.config['OFFLINE_RETRY_SECONDS'])
+            return queue_offline_order(journal, cart, customer, user_id)
+        except BaseException:
+            # Anything else, including a bad order (constraint or data
+            # error), fails as usual but must not keep the slot
+            db.session.rollback()
+            kitchen.release(pickup_at)
+            raise
+
+        after_checkout(sold_out)
         
-        logger.info(f'Order {order.order_number} created successfully - Total: ${total:.2f}')
+        logger.info('Order %s created successfully - Total: $%s', order.order_number, format_money(total))
 
         session['cart'] = []
 
         return redirect(url_for('cart.order_success', order_id=order.id))
 
     cart_count = sum(item['quantity'] for item in cart)
-    return render_template('checkout.html', cart=cart, total=total, cart_count=cart_count)
+    return render_template('checkout.html', cart=cart, total=total, cart_count=cart_count, form={})
+
+
+def queue_offline_order(journal, cart, customer, user_id):
+    """Record the order in the local journal for a later sync"""
+    source_key, order_number = journal.append(cart, customer, user_id)
+    logger.info('Order %s journaled offline (%s)', order_number, source_key)
+    session['cart'] = []
+    return render_template('order_queued.html', order_number=order_number,
+                           total=cart_total(cart))
 
 
 @cart_bp.route('/order-success/<int:order_id>')
 def order_success(order_id):
     order = Order.query.get_or_404(order_id)
-    logger.info(f'Order success page viewed for {order.order_number}')
+    logger.info('Order success page viewed for %s', order.order_number)
     return render_template('order_success.html', order=order)
 
 
 @cart_bp.route('/api/track/<int:order_id>')
-def track_order_api(order_id):
-    """Real-time order tracking API endpoint"""
-    order = Order.query.get_or_404(order_id)
-    logger.debug(f'Tracking request for order {order.order_number}')
-    return jsonify(order.to_tracking_dict())
+@cart_bp.route('/api/track/<location>/<int:order_id>')
+@read_replica
+def track_order_api(order_id, location=None):
+    """Real-time order tracking API endpoint
+
+    Tracking pages poll the form with the order's location in it, so they
+    keep working whatever location the session is on.
+    """
+    if location is not None and location not in get_locations():
+        abort(404)
+    payload = get_tracking(order_id, location)
+    if payload is None:
+        abort(404)
+    logger.debug('Tracking request for order %s', payload['order_number'])
+    return jsonify(payload)
 
 
 @cart_bp.route('/api/track/number/<order_number>')
+@read_replica
 def track_order_by_number(order_number):
     """Track order by order number"""
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
-    logger.debug(f'Tracking request for order {order.order_number}')
-    return jsonify(order.to_tracking_dict())
+    found = find_order(order_number)
+    payload = get_tracking(found[1], found[0]) if found is not None else None
+    if payload is None:
+        abort(404)
+    logger.debug('Tracking request for order %s', order_number)
+    return jsonify(payload)
 
 
 @cart_bp.route('/track/<order_number>')
 def track_order_page(order_number):
-    """Order tracking page for customers"""
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
-    return render_template('track_order.html', order=order)
-
+    """Order tracking page for customers, for an order from any location"""
+    found = find_order(order_number)
+    if found is None:
+        abort(404)
+    location, order_id = found
+    with use_location(location):
+        order = db.session.get(Order, order_id)
+        if order is None:
+            abort(404)
+        return render_template('track_order.html', order=order)
+
+
+def get_my_orders_page(cursor=None, limit=MY_ORDERS_PAGE_SIZE):
+    """One page of the current user's orders from every location
+
+    Reads plain rows from the Order table alone; ids repeat across
+    per-location databases, so these can't go through the identity map.
+    Each database is paged on its own and the pages merged.
+    """
+    orders, more = [], False
+    for location in database_locations(current_app):
+        with use_location(location):
+            query = db.session.query(
+                Order.id, Order.order_number, Order.status, Order.total_cents, Order.created_at,
+                Order.item_count, Order.items_summary
+            ).execution_options(all_locations=True).filter(Order.user_id == current_user.id)
+            page, next_cursor = keyset_page(query, Order.created_at, Order.id, cursor=cursor, limit=limit)
+        orders.extend(page)
+        more = more or next_cursor is not None
+
+    orders.sort(key=lambda o: (o.created_at, o.id), reverse=True)
+    if len(orders) > limit:
+        orders, more = orders[:limit], True
+    next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id) if more else None
+    return orders, next_cursor
+
+
+@cart_bp.route('/my-orders')
+@login_required
+def my_orders():
+    """Order history for the logged-in customer"""
+    orders, next_cursor = get_my_orders_page(request.args.get('cursor'))
+    cart_count = sum(item['quantity'] for item in session.get('cart', []))
+    return render_template('my_orders.html', orders=orders, next_cursor=next_cursor, cart_count=cart_count)
+
+
+@cart_bp.route('/api/my-orders')
+@login_required
+def api_my_orders():
+    """JSON order history for the logged-in customer"""
+    limit = max(1, min(request.args.get('limit', MY_ORDERS_PAGE_SIZE, type=int), MY_ORDERS_PAGE_SIZE))
+    orders, next_cursor = get_my_orders_page(request.args.get('cursor'), limit)
+    return jsonify({
+        'orders': [{
+            'id': o.id,
+            'order_number': o.order_number,
+            'status': o.status,
+            'total': o.total_cents / 100,
+            'total_cents': o.total_cents,
+            'item_count': o.item_count,
+            'items_summary': o.items_summary,
+            'created_at': o.created_at.isoformat()
+        } for o in orders],
+        'next_cursor': next_cursor
+    })
@@ -1,8 +1,9 @@
 import logging
-from flask import Blueprint, render_template, request, session
+from flask import Blueprint, render_template, request, session, jsonify
 from flask_login import current_user
-from datetime import datetime
-from app.models import MenuItem, User, Order
+from app.catalog import get_menu_items
+from app.search import search_menu
+from app.stats import get_stats
 
 logger = logging.getLogger(__name__)
 
@@ -12,15 +13,16 @@ main_bp = Blueprint('main', __name__)
 @main_bp.route('/')
 def home():
     logger.debug('Home page accessed')
-    menu_items = MenuItem.query.filter_by(available=True).all()
-    popular_items = MenuItem.query.filter_by(popular=True, available=True).limit(3).all()
-    staff_count = User.query.filter(User.role.in_(['staff', 'manager', 'admin'])).count()
-    order_count = Order.query.filter(Order.created_at >= datetime.utcnow().date()).count()
+    menu_items = get_menu_items()
+    popular_items = get_menu_items(popular=True)[:3]
+    stats = get_stats()
+    staff_count = stats['staff_count']
+    order_count = stats['orders_today']
 
     cart = session.get('cart', [])
     cart_count = sum(item['quantity'] for item in cart)
 
-    logger.info(f'Home page loaded - {len(menu_items)} items, {order_count} orders today')
+    logger.info('Home page loaded - %d items, %d orders today', len(menu_items), order_count)
     
     return render_template(
         'home.html',
@@ -35,14 +37,40 @@ def home():
 @main_bp.route('/menu')
 def menu():
     category = request.args.get('category', 'all')
+    query = request.args.get('q', '').strip()
 
-    if category == 'all':
-        items = MenuItem.query.filter_by(available=True).all()
+    if query:
+        items = search_menu(query, category=None if category == 'all' else category)
     else:
-        items = MenuItem.query.filter_by(category=category, available=True).all()
+        items = get_menu_items(category=category)
 
     cart = session.get('cart', [])
     cart_count = sum(item['quantity'] for item in cart)
 
-    return render_template('menu.html', items=items, category=category, cart_count=cart_count)
+    return render_template('menu.html', items=items, category=category, query=query, cart_count=cart_count)
+
+
+@main_bp.route('/api/menu/search')
+def api_menu_search():
+    """Prefix search over menu item names, categories and descriptions
+
+    Optionally restricted to one `category`.
+    """
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category') or None
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+    return jsonify({
+        'query': query,
+        'results': [{
+            'id': item['id'],
+            'name': item['name'],
+            'description': item['description'],
+            'price': item['price_cents'] / 100,
+            'price_cents': item['price_cents'],
+            'category': item['category'],
+            'popular': item['popular'],
+            'spicy': item['spicy'],
+            'image_url': item['image_url']
+        } for item in search_menu(query, limit=limit, category=category)]
+    })
 
@@ -1,154 +1,85 @@
+import csv
+import io
 import logging
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
-from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 from app import db
-from app.models import Order, User, MenuItem, StaffClockIn, OrderItem
+from app.models import Order, MenuItem, StaffClockIn, User
+from app.inventory import set_stock
+from app.capacity import kitchen
+from app.timesheets import get_timesheet, period_start, parse_day
+from app.pagination import keyset_page
+from app.replica import read_replica
+from app.cache import cache_metrics
+from app.dashboard import get_snapshot
 
 logger = logging.getLogger(__name__)
 
 manager_bp = Blueprint('manager', __name__)
 
 
+def _deny(message, endpoint):
+    # JSON and CSV endpoints are fetched by scripts, which can't follow a redirect to a page
+    if request.path.startswith('/manager/api/') or request.path.endswith('.csv'):
+        return jsonify({'error': message}), 403
+    flash(message, 'error')
+    return redirect(url_for(endpoint))
+
+
+def _current_role():
+    # current_user may come from another worker's stale cache entry, so a
+    # demoted or deleted account is caught by reading the role itself
+    if not current_user.is_authenticated:
+        return None
+    return db.session.query(User.role).filter_by(id=current_user.id).scalar()
+
+
 def staff_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not current_user.is_staff():
-            flash('You need staff access to view this page.', 'error')
-            return redirect(url_for('auth.staff_portal'))
+        if _current_role() not in ['staff', 'manager', 'admin']:
+            return _deny('You need staff access to view this page.', 'auth.staff_portal')
         return f(*args, **kwargs)
     return decorated_function
 
 
-def get_analytics():
-    """Calculate comprehensive analytics"""
-    today = datetime.utcnow().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # Today's stats
-    today_orders = Order.query.filter(
-        func.date(Order.created_at) == today,
-        Order.status != 'cancelled'
-    ).all()
-    today_revenue = sum(o.total for o in today_orders)
-    
-    # This week's stats
-    week_orders = Order.query.filter(
-        func.date(Order.created_at) >= week_ago,
-        Order.status != 'cancelled'
-    ).all()
-    week_revenue = sum(o.total for o in week_orders)
-    
-    # This month's stats
-    month_orders = Order.query.filter(
-        func.date(Order.created_at) >= month_ago,
-        Order.status != 'cancelled'
-    ).all()
-    month_revenue = sum(o.total for o in month_orders)
-    
-    # Average order value
-    avg_order = month_revenue / len(month_orders) if month_orders else 0
-    
-    # Top selling items (last 30 days)
-    top_items = db.session.query(
-        OrderItem.name,
-        func.sum(OrderItem.quantity).label('total_qty')
-    ).join(Order).filter(
-        func.date(Order.created_at) >= month_ago,
-        Order.status != 'cancelled'
-    ).group_by(OrderItem.name).order_by(func.sum(OrderItem.quantity).desc()).limit(5).all()
-    
-    # Hourly distribution for today
-    hourly_orders = {}
-    for order in today_orders:
-        hour = order.created_at.hour
-        hourly_orders[hour] = hourly_orders.get(hour, 0) + 1
-    
-    # Daily revenue for the past 7 days
-    daily_revenue = []
-    for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        day_orders = Order.query.filter(
-            func.date(Order.created_at) == day,
-            Order.status != 'cancelled'
-        ).all()
-        daily_revenue.append({
-            'date': day.strftime('%a'),
-            'revenue': sum(o.total for o in day_orders),
-            'orders': len(day_orders)
-        })
-    
-    return {
-        'today_orders': len(today_orders),
-        'today_revenue': today_revenue,
-        'week_orders': len(week_orders),
-        'week_revenue': week_revenue,
-        'month_orders': len(month_orders),
-        'month_revenue': month_revenue,
-        'avg_order_value': avg_order,
-        'top_items': top_items,
-        'hourly_orders': hourly_orders,
-        'daily_revenue': daily_revenue
-    }
+def manager_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if _current_role() not in ['manager', 'admin']:
+            return _deny('You need manager access to view this page.', 'manager.dashboard')
+        return f(*args, **kwargs)
+    return decorated_function
 
 
 @manager_bp.route('/manager')
 @login_required
 @staff_required
 def dashboard():
-    logger.info(f'Dashboard accessed by {current_user.email}')
-    
-    # Get orders
-    orders = Order.query.order_by(Order.created_at.desc()).limit(50).all()
-    active_orders = [o for o in orders if o.status in ['paid', 'preparing', 'ready']]
-    
-    # Basic stats
-    stats = {
-        'total_orders': Order.query.count(),
-        'pending': Order.query.filter(Order.status.in_(['pending', 'paid'])).count(),
-        'preparing': Order.query.filter_by(status='preparing').count(),
-        'ready': Order.query.filter_by(status='ready').count(),
-        'completed_today': Order.query.filter(
-            Order.status == 'completed',
-            func.date(Order.created_at) == datetime.utcnow().date()
-        ).count(),
-        'revenue': db.session.query(func.sum(Order.total)).filter(
-            Order.status != 'cancelled'
-        ).scalar() or 0
-    }
-    
-    # Analytics
-    analytics = get_analytics()
-    
-    # Staff currently clocked in
-    active_staff = StaffClockIn.query.filter_by(clock_out=None).all()
+    logger.info('Dashboard accessed by %s', current_user.email)
     
-    # All staff members
-    all_staff = User.query.filter(User.role.in_(['staff', 'manager', 'admin'])).all()
+    # Orders, stats, analytics, staff and stock come from the shared snapshot
+    snapshot = get_snapshot()
     
-    # Current user's clock status
-    my_clock = StaffClockIn.query.filter_by(
+    # Current user's clock status, wherever they clocked in
+    my_clock = StaffClockIn.query.execution_options(all_locations=True).filter_by(
         user_id=current_user.id,
         clock_out=None
     ).first()
     
-    # Today's clock records
-    today_clocks = StaffClockIn.query.filter(
-        func.date(StaffClockIn.clock_in) == datetime.utcnow().date()
-    ).order_by(StaffClockIn.clock_in.desc()).all()
-    
     return render_template('manager.html', 
-        orders=orders,
-        active_orders=active_orders,
-        stats=stats,
-        analytics=analytics,
-        active_staff=active_staff,
-        all_staff=all_staff,
+        orders=snapshot.orders,
+        active_orders=snapshot.active_orders,
+        stats=snapshot.stats,
+        analytics=snapshot.analytics,
+        active_staff=snapshot.active_staff,
         my_clock=my_clock,
-        today_clocks=today_clocks,
+        today_clocks=snapshot.today_clocks,
+        menu_items=snapshot.menu_items,
         now=datetime.utcnow()
     )
 
@@ -163,25 +94,65 @@ def update_order_status(order_id):
 
     valid_statuses = ['pending', 'paid', 'preparing', 'ready', 'completed', 'cancelled']
     if new_status in valid_statuses:
+        old_status = order.status
         order.update_status(new_status, notes=notes or f'Updated by {current_user.name or current_user.email}')
         db.session.commit()
+        kitchen.status_changed(order.pickup_at, old_status, new_status)
         
-        logger.info(f'Order {order.order_number} status updated to {new_status} by {current_user.email}')
+        logger.info('Order %s status updated to %s by %s', order.order_number, new_status, current_user.email)
         flash(f'Order #{order.order_number} updated to {new_status}.', 'success')
     else:
-        logger.warning(f'Invalid status {new_status} attempted for order {order.order_number}')
+        logger.warning('Invalid status %s attempted for order %s', new_status, order.order_number)
+
+    return redirect(url_for('manager.dashboard'))
+
+
+@manager_bp.route('/manager/menu/<int:item_id>/stock', methods=['POST'])
+@login_required
+@staff_required
+def update_stock(item_id):
+    item = MenuItem.query.get_or_404(item_id)
+    raw_stock = request.form.get('stock', '').strip()
+
+    if raw_stock == '':
+        stock = None
+    elif raw_stock.isdigit():
+        stock = int(raw_stock)
+    else:
+        flash('Stock must be a whole number, or blank to stop tracking.', 'error')
+        return redirect(url_for('manager.dashboard'))
+
+    set_stock(item, stock)
+    db.session.commit()
 
+    logger.info('Stock for %s updated by %s', item.name, current_user.email)
+    flash(f'{item.name} stock updated.', 'success')
     return redirect(url_for('manager.dashboard'))
 
 
+@manager_bp.route('/manager/api/inventory')
+@login_required
+@staff_required
+def api_inventory():
+    """API endpoint for current stock levels"""
+    items = MenuItem.query.order_by(MenuItem.category, MenuItem.name).all()
+    return jsonify([{
+        'id': i.id,
+        'name': i.name,
+        'category': i.category,
+        'stock': i.stock,
+        'available': i.available
+    } for i in items])
+
+
 # ============ CLOCK IN/OUT ============
 
 @manager_bp.route('/manager/clock-in', methods=['POST'])
 @login_required
 @staff_required
 def clock_in():
-    # Check if already clocked in
-    existing = StaffClockIn.query.filter_by(
+    # Check if already clocked in, at any location
+    existing = StaffClockIn.query.execution_options(all_locations=True).filter_by(
         user_id=current_user.id,
         clock_out=None
     ).first()
@@ -198,7 +169,7 @@ def clock_in():
     db.session.add(clock_record)
     db.session.commit()
     
-    logger.info(f'{current_user.email} clocked in at {clock_record.clock_in}')
+    logger.info('%s clocked in at %s', current_user.email, clock_record.clock_in)
     flash('Successfully clocked in! 🟢', 'success')
     return redirect(url_for('manager.dashboard'))
 
@@ -207,7 +178,7 @@ def clock_in():
 @login_required
 @staff_required
 def clock_out():
-    clock_record = StaffClockIn.query.filter_by(
+    clock_record = StaffClockIn.query.execution_options(all_locations=True).filter_by(
         user_id=current_user.id,
         clock_out=None
     ).first()
@@ -220,7 +191,7 @@ def clock_out():
     clock_record.break_minutes = int(request.form.get('break_minutes', 0))
     db.session.commit()
     
-    logger.info(f'{current_user.email} clocked out. Worked {clock_record.hours_worked} hours')
+    logger.info('%s clocked out. Worked %s hours', current_user.email, clock_record.hours_worked)
     flash(f'Clocked out! You worked {clock_record.hours_worked} hours today. 🔴', 'success')
     return redirect(url_for('manager.dashboard'))
 
@@ -228,33 +199,185 @@ def clock_out():
 @manager_bp.route('/manager/api/stats')
 @login_required
 @staff_required
+@read_replica
 def api_stats():
     """API endpoint for real-time dashboard updates"""
-    stats = {
-        'pending': Order.query.filter(Order.status.in_(['pending', 'paid'])).count(),
-        'preparing': Order.query.filter_by(status='preparing').count(),
-        'ready': Order.query.filter_by(status='ready').count(),
-        'active_staff': StaffClockIn.query.filter_by(clock_out=None).count()
-    }
-    return jsonify(stats)
+    stats = get_snapshot().stats
+    return jsonify({key: stats[key] for key in ('pending', 'preparing', 'ready', 'active_staff')})
+
+
+@manager_bp.route('/manager/api/cache')
+@login_required
+@manager_required
+def api_cache():
+    """Cache hit/miss counters for this worker"""
+    return jsonify(cache_metrics())
 
 
 @manager_bp.route('/manager/api/orders')
 @login_required
 @staff_required
+@read_replica
 def api_orders():
     """API endpoint for real-time order updates"""
-    orders = Order.query.filter(
-        Order.status.in_(['paid', 'preparing', 'ready'])
-    ).order_by(Order.created_at.desc()).limit(20).all()
+    orders = get_snapshot().active_orders[:20]
     
     return jsonify([{
         'id': o.id,
         'order_number': o.order_number,
         'customer_name': o.customer_name,
         'status': o.status,
-        'total': o.total,
+        'total': o.total_cents / 100,
+        'total_cents': o.total_cents,
         'items': [{'name': i.name, 'qty': i.quantity} for i in o.items],
         'created_at': o.created_at.isoformat(),
         'elapsed_minutes': int((datetime.utcnow() - o.created_at).total_seconds() / 60)
     } for o in orders])
+
+
+# ============ TIMESHEETS ============
+
+TIMESHEET_PAGE_SIZES = {'day': (7, 62), 'week': (4, 26)}
+
+
+@manager_bp.route('/manager/api/timesheets')
+@login_required
+@manager_required
+def api_timesheets():
+    """Hours per staff member per day or week, one page of periods at a time
+
+    Pages walk backwards in time: pass the returned `next_before` as
+    `before` to fetch the previous page.
+    """
+    period = request.args.get('period', 'day')
+    if period not in TIMESHEET_PAGE_SIZES:
+        return jsonify({'error': 'period must be day or week'}), 400
+
+    default_size, max_size = TIMESHEET_PAGE_SIZES[period]
+    limit = max(1, min(request.args.get('limit', default_size, type=int), max_size))
+    user_id = request.args.get('user_id', type=int)
+
+    before = parse_day(request.args.get('before'), datetime.utcnow().date() + timedelta(days=1))
+    if period == 'week':
+        # Round up to the next Monday so pages hold whole weeks
+        before = period_start(before + timedelta(days=6), 'week')
+        start = before - timedelta(weeks=limit)
+    else:
+        start = before - timedelta(days=limit)
+
+    rows = get_timesheet(start, before, period=period, user_id=user_id)
+    return jsonify({
+        'period': period,
+        'start': start.isoformat(),
+        'before': before.isoformat(),
+        'next_before': start.isoformat(),
+        'rows': rows
+    })
+
+
+@manager_bp.route('/manager/timesheets.csv')
+@login_required
+@manager_required
+def timesheets_csv():
+    """Stream a timesheet CSV for [start, end), one month of days per query"""
+    period = request.args.get('period', 'day')
+    if period not in TIMESHEET_PAGE_SIZES:
+        period = 'day'
+    end = parse_day(request.args.get('end'), datetime.utcnow().date() + timedelta(days=1))
+    start = period_start(parse_day(request.args.get('start'), end - timedelta(days=28)), period)
+    user_id = request.args.get('user_id', type=int)
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['period_start', 'user_id', 'user_name', 'hours_worked', 'break_minutes', 'shifts'])
+
+        chunk_start = start
+        while chunk_start < end:
+            # Whole weeks per chunk so a week is never split across two rows
+            chunk_end = min(chunk_start + timedelta(weeks=4), end)
+            rows = get_timesheet(chunk_start, chunk_end, period=period, user_id=user_id)
+            for row in sorted(rows, key=lambda r: (r['period_start'], r['user_name'] or '')):
+                writer.writerow([row['period_start'], row['user_id'], row['user_name'],
+                                 row['hours_worked'], row['break_minutes'], row['shifts']])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            chunk_start = chunk_end
+
+    filename = f'timesheets_{start.isoformat()}_{end.isoformat()}.csv'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+# ============ ORDER HISTORY ============
+
+ORDER_STATUSES = ['pending', 'paid', 'preparing', 'ready', 'completed', 'cancelled']
+ORDER_HISTORY_MAX_LIMIT = 100
+
+
+def get_order_history_page(args):
+    """Filter and keyset-paginate orders from request args
+
+    Supports status, from/to dates (inclusive, YYYY-MM-DD), customer
+    (exact email or phone), cursor and limit. Returns (orders, next_cursor).
+    """
+    query = Order.query.options(selectinload(Order.items))
+
+    status = args.get('status')
+    if status in ORDER_STATUSES:
+        query = query.filter(Order.status == status)
+
+    date_from = parse_day(args.get('from'), None)
+    if date_from:
+        query = query.filter(Order.created_at >= datetime.combine(date_from, datetime.min.time()))
+    date_to = parse_day(args.get('to'), None)
+    if date_to:
+        query = query.filter(Order.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+
+    customer = (args.get('customer') or '').strip()
+    if customer:
+        query = query.filter(or_(Order.customer_email == customer, Order.customer_phone == customer))
+
+    limit = max(1, min(args.get('limit', 25, type=int), ORDER_HISTORY_MAX_LIMIT))
+    return keyset_page(query, Order.created_at, Order.id, cursor=args.get('cursor'), limit=limit)
+
+
+@manager_bp.route('/manager/orders')
+@login_required
+@staff_required
+def order_history():
+    orders, next_cursor = get_order_history_page(request.args)
+    filters = {key: request.args.get(key, '') for key in ['status', 'from', 'to', 'customer']}
+    return render_template('manager_orders.html',
+        orders=orders,
+        next_cursor=next_cursor,
+        filters=filters,
+        statuses=ORDER_STATUSES
+    )
+
+
+@manager_bp.route('/manager/api/orders/history')
+@login_required
+@staff_required
+def api_order_history():
+    """Keyset-paginated order history; pass next_cursor back as cursor"""
+    orders, next_cursor = get_order_history_page(request.args)
+    return jsonify({
+        'orders': [{
+            'id': o.id,
+            'order_number': o.order_number,
+            'customer_name': o.customer_name,
+            'customer_email': o.customer_email,
+            'customer_phone': o.customer_phone,
+            'status': o.status,
+            'total': o.total_cents / 100,
+            'total_cents': o.total_cents,
+            'items': [{'name': i.name, 'qty': i.quantity} for i in o.items],
+            'created_at': o.created_at.isoformat()
+        } for o in orders],
+        'next_cursor': next_cursor
+    })
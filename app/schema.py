@@ -0,0 +1,244 @@
+import logging
+import sys
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(engine=None):
+    """Bring an existing database up to date with the models
+
+    db.create_all() only creates missing tables, so columns and indexes
+    added to existing models are applied here. New columns must be
+    nullable or carry a server_default.
+
+    `engine` defaults to the main database; only the tables that exist in
+    it are touched.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    dialect = engine.dialect
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            ddl = 'ALTER TABLE {} ADD COLUMN {} {}'.format(
+                dialect.identifier_preparer.format_table(table),
+                dialect.identifier_preparer.format_column(column),
+                column.type.compile(dialect=dialect)
+            )
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += ' DEFAULT {}'.format(
+                    default.text if hasattr(default, 'text') else "'{}'".format(default)
+                )
+            elif not column.nullable:
+                raise RuntimeError(
+                    'Cannot add NOT NULL column {}.{} without a server_default'.format(table.name, column.name)
+                )
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+            logger.info('Added column %s.%s', table.name, column.name)
+
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                logger.info('Created index %s', index.name)
+
+
+# (table, float dollar column, integer cent column that replaces it)
+MONEY_COLUMNS = [
+    ('menu_item', 'price', 'price_cents'),
+    ('order', 'total', 'total_cents'),
+    ('order_item', 'price', 'price_cents'),
+    ('daily_sales', 'total_revenue', 'total_revenue_cents'),
+    ('daily_sales', 'avg_order_value', 'avg_order_value_cents'),
+]
+
+
+def _legacy_money_columns(inspector):
+    return [(table_name, legacy, column) for table_name, legacy, column in MONEY_COLUMNS
+            if inspector.has_table(table_name)
+            and legacy in {c['name'] for c in inspector.get_columns(table_name)}]
+
+
+def migrate_money_columns(engine=None):
+    """Move float dollar amounts into their integer cent columns
+
+    Runs after upgrade_schema() has added the cent columns. Each amount is
+    rounded to the nearest cent in SQL, then the float column is dropped
+    since new rows no longer fill it in.
+    """
+    engine = engine or db.engine
+    quote = engine.dialect.identifier_preparer.quote
+
+    for table_name, legacy, column in _legacy_money_columns(inspect(engine)):
+        table, legacy_column, cents_column = quote(table_name), quote(legacy), quote(column)
+        with engine.begin() as conn:
+            migrated = conn.execute(text(
+                f'UPDATE {table} SET {cents_column} = CAST(ROUND({legacy_column} * 100) AS INTEGER) '
+                f'WHERE {legacy_column} IS NOT NULL'
+            )).rowcount
+            conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {legacy_column}'))
+        logger.info('Migrated %d rows of %s.%s to %s', migrated, table_name, legacy, column)
+
+
+def _daily_sales_unique_by_date(inspector):
+    if not inspector.has_table('daily_sales'):
+        return False
+    uniques = [c['column_names'] for c in inspector.get_unique_constraints('daily_sales')]
+    uniques += [i['column_names'] for i in inspector.get_indexes('daily_sales') if i['unique']]
+    return ['date'] in uniques
+
+
+def rebuild_daily_sales(engine=None):
+    """Replace daily_sales' UNIQUE (date) with UNIQUE (location, date)
+
+    Databases created before locations only allow one row per date, so a
+    second location's summary for the same day fails. SQLite can't drop a
+    constraint, so the rows are copied into a table built from the model.
+    Runs after migrate_money_columns(); columns the model no longer has
+    would be lost in the copy.
+    """
+    from app.models import DailySales
+
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    if not _daily_sales_unique_by_date(inspector):
+        return
+
+    table = DailySales.__table__
+    existing = [c['name'] for c in inspector.get_columns('daily_sales')]
+    dropped = [name for name in existing if name not in table.columns]
+    if dropped:
+        raise RuntimeError(f'Cannot rebuild daily_sales while it has columns {dropped} the model lacks')
+    columns = ', '.join(quote(name) for name in existing)
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE daily_sales RENAME TO daily_sales_old'))
+        table.create(bind=conn)
+        conn.execute(text(f'INSERT INTO daily_sales ({columns}) SELECT {columns} FROM daily_sales_old'))
+        conn.execute(text('DROP TABLE daily_sales_old'))
+    logger.info('Rebuilt daily_sales with a per-location unique date')
+
+
+def _orders_missing_summaries(engine, inspector):
+    if not inspector.has_table('order') or 'items_summary' not in {c['name'] for c in inspector.get_columns('order')}:
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text('SELECT 1 FROM "order" WHERE items_summary IS NULL LIMIT 1')).first() is not None
+
+
+def backfill_order_summaries(engine=None, batch_size=500):
+    """Fill item_count/items_summary for orders placed before they existed
+
+    Works on every order in `engine`'s database whatever its location,
+    committing a batch at a time.
+    """
+    from app.models import Order, OrderItem
+
+    engine = engine or db.engine
+    if not _orders_missing_summaries(engine, inspect(engine)):
+        return
+    total = 0
+    with Session(engine) as session:
+        while True:
+            orders = session.scalars(
+                select(Order).where(Order.items_summary.is_(None)).limit(batch_size)
+            ).all()
+            if not orders:
+                break
+            lines = {}
+            items = session.scalars(
+                select(OrderItem).where(OrderItem.order_id.in_([o.id for o in orders])).order_by(OrderItem.id)
+            )
+            for item in items:
+                lines.setdefault(item.order_id, []).append((item.name, item.quantity))
+            for order in orders:
+                order.set_item_summary(lines.get(order.id, []))
+            session.commit()
+            total += len(orders)
+    logger.info('Backfilled item summaries for %d orders', total)
+
+
+def pending_migrations(engine=None):
+    """Names of the one-shot migrations `engine` still needs"""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    pending = []
+    if _legacy_money_columns(inspector):
+        pending.append('money columns to cents')
+    if _daily_sales_unique_by_date(inspector):
+        pending.append('daily_sales per-location unique date')
+    if _orders_missing_summaries(engine, inspector):
+        pending.append('order summaries')
+    return pending
+
+
+def _running_migrate_command():
+    """Whether this process is `flask schema migrate`, which has to start on
+    a database the app otherwise refuses"""
+    args = sys.argv[1:]
+    return any(args[i:i + 2] == ['schema', 'migrate'] for i in range(len(args)))
+
+
+def check_migrations(engine=None):
+    """Warn about pending migrations, refusing to start on unmigrated money
+
+    Until the money columns move to cents every price and total reads as
+    zero and checkout can't insert orders, so the app doesn't boot at all.
+    """
+    pending = pending_migrations(engine)
+    if not pending:
+        return
+    url = (engine or db.engine).url.render_as_string(hide_password=True)
+    message = f"Database {url} needs `flask schema migrate`: {', '.join(pending)}"
+    if 'money columns to cents' in pending:
+        message += '. Until it runs, prices and order totals read as $0.00 and checkout fails'
+        if not _running_migrate_command():
+            raise RuntimeError(message)
+    current_app.logger.warning(message)
+
+
+def run_migrations(engine=None):
+    """Apply the one-shot migrations, in order
+
+    These rewrite or drop columns and tables, so they don't run on
+    startup where every worker would race to apply them; `flask schema
+    migrate` runs them once.
+    """
+    migrate_money_columns(engine)
+    rebuild_daily_sales(engine)
+    backfill_order_summaries(engine)
+
+
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    """Apply pending one-shot migrations to every database
+
+    Run once per upgrade, before starting the new version's workers.
+    """
+    from app.locations import location_engines
+    for name, engine in [('main', db.engine)] + location_engines(current_app):
+        pending = pending_migrations(engine)
+        if not pending:
+            click.echo(f'{name}: up to date')
+            continue
+        run_migrations(engine)
+        click.echo(f"{name}: applied {', '.join(pending)}")
+
+
+schema_cli = click.Group('schema', help='Database migrations.')
+schema_cli.add_command(migrate_command)
@@ -0,0 +1,162 @@
+import bisect
+import logging
+import re
+import threading
+from app.catalog import get_catalog
+from app.locations import current_location
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Score per occurrence of a term in each field
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'tags': 2.0, 'description': 1.0}
+POPULAR_BOOST = 1.5
+# Prefix matches score less than whole-word matches
+PREFIX_FACTOR = 0.6
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _fingerprint(item):
+    return (item['name'], item['description'], item['category'], item['popular'], item['spicy'], item['price_cents'])
+
+
+class MenuSearchIndex:
+    """Inverted index over the catalog snapshot with prefix matching
+
+    Postings map token -> {item_id: weight}. A sorted vocabulary lets a
+    prefix query bisect to its matching tokens instead of scanning.
+    sync() diffs a new catalog snapshot against the indexed one and only
+    re-indexes items that were added, removed or changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._vocabulary = []
+        self._doc_tokens = {}
+        self._fingerprints = {}
+        self._items = {}
+        self._snapshot = None
+
+    def _remove(self, item_id):
+        for token in self._doc_tokens.pop(item_id, ()):
+            postings = self._postings[token]
+            postings.pop(item_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[index]
+        self._fingerprints.pop(item_id, None)
+        self._items.pop(item_id, None)
+
+    def _add(self, item):
+        weights = {}
+        fields = {
+            'name': item['name'],
+            'category': item['category'],
+            'description': item['description'],
+            'tags': ' '.join(tag for tag, flag in (('spicy', item['spicy']), ('popular', item['popular'])) if flag),
+        }
+        for field, text in fields.items():
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field]
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            self._postings[token][item['id']] = weight
+        self._doc_tokens[item['id']] = list(weights)
+        self._fingerprints[item['id']] = _fingerprint(item)
+        self._items[item['id']] = item
+
+    def sync(self, snapshot):
+        """Bring the index in line with a catalog snapshot"""
+        if snapshot is self._snapshot:
+            return
+        with self._lock:
+            if snapshot is self._snapshot:
+                return
+            current = {item['id']: item for item in snapshot}
+            changed = 0
+            for item_id in [i for i in self._fingerprints if i not in current]:
+                self._remove(item_id)
+                changed += 1
+            for item_id, item in current.items():
+                fingerprint = self._fingerprints.get(item_id)
+                if fingerprint == _fingerprint(item):
+                    self._items[item_id] = item
+                    continue
+                if fingerprint is not None:
+                    self._remove(item_id)
+                self._add(item)
+                changed += 1
+            self._snapshot = snapshot
+            logger.debug('Search index synced - %d items re-indexed', changed)
+
+    def _term_scores(self, term):
+        scores = {}
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for item_id, weight in self._postings[token].items():
+                scores[item_id] = max(scores.get(item_id, 0), weight * factor)
+        return scores
+
+    def search(self, query, limit=20, category=None):
+        """Items matching every query term (as a word prefix), best first
+
+        With a category only that category's items are ranked, so the limit
+        applies to the filtered results.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            totals = None
+            for term in terms:
+                scores = self._term_scores(term)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {i: totals[i] + s for i, s in scores.items() if i in totals}
+                if not totals:
+                    return []
+
+            ranked = []
+            for item_id, score in totals.items():
+                item = self._items[item_id]
+                if category is not None and item['category'] != category:
+                    continue
+                if item['popular']:
+                    score *= POPULAR_BOOST
+                ranked.append((-score, item['name'], item_id))
+            ranked.sort()
+            return [self._items[item_id] for _, _, item_id in ranked[:limit]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_menu_index(location):
+    """The search index for one location, created on first use"""
+    index = _indexes.get(location)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(location, MenuSearchIndex())
+    return index
+
+
+def search_menu(query, limit=20, category=None):
+    """Search the current location's menu, syncing its index to the catalog first"""
+    index = get_menu_index(current_location())
+    index.sync(get_catalog())
+    return index.search(query, limit=limit, category=category)
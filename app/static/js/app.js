@@ -0,0 +1,25 @@
+// Auto-hide flash messages
+setTimeout(() => {
+    document.querySelectorAll('.flash').forEach(el => {
+        el.style.opacity = '0';
+        setTimeout(() => el.remove(), 300);
+    });
+}, 5000);
+
+// Add to cart AJAX
+function addToCart(itemId) {
+    fetch('/cart/add/' + itemId, { method: 'POST' })
+        .then(res => res.json())
+        .then(data => {
+            if (data.success) {
+                const badge = document.querySelector('.cart-badge');
+                if (badge) {
+                    badge.textContent = data.cart_count;
+                } else {
+                    location.reload();
+                }
+            } else if (data.error) {
+                alert(data.error);
+            }
+        });
+}
@@ -0,0 +1,15 @@
+// Filter table
+document.querySelectorAll('.filter-chip').forEach(chip => {
+    chip.addEventListener('click', function() {
+        document.querySelectorAll('.filter-chip').forEach(c => c.classList.remove('active'));
+        this.classList.add('active');
+        
+        const status = this.dataset.status;
+        document.querySelectorAll('.data-table tbody tr').forEach(row => {
+            row.style.display = (status === 'all' || row.dataset.status === status) ? '' : 'none';
+        });
+    });
+});
+
+// Auto-refresh
+setTimeout(() => location.reload(), 30000);
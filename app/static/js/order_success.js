@@ -0,0 +1,30 @@
+const trackingEl = document.getElementById('orderTracking');
+const trackUrl = trackingEl.dataset.trackUrl;
+const orderCreatedAt = new Date(trackingEl.dataset.createdAt);
+
+// Update elapsed time
+function updateElapsedTime() {
+    const now = new Date();
+    const elapsed = Math.floor((now - orderCreatedAt) / 1000);
+    const minutes = Math.floor(elapsed / 60);
+    const seconds = elapsed % 60;
+    document.getElementById('elapsedTime').textContent = 
+        `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
+}
+
+// Fetch status updates
+async function fetchStatus() {
+    try {
+        const response = await fetch(trackUrl);
+        const data = await response.json();
+        document.getElementById('liveStatus').textContent = 
+            data.status.charAt(0).toUpperCase() + data.status.slice(1);
+    } catch (error) {
+        console.error('Error:', error);
+    }
+}
+
+updateElapsedTime();
+setInterval(updateElapsedTime, 1000);
+fetchStatus();
+setInterval(fetchStatus, 5000);
@@ -0,0 +1,103 @@
+const trackingEl = document.getElementById('orderTracking');
+const trackUrl = trackingEl.dataset.trackUrl;
+const orderCreatedAt = new Date(trackingEl.dataset.createdAt);
+let currentStatus = trackingEl.dataset.status;
+
+// Update elapsed time every second
+function updateElapsedTime() {
+    const now = new Date();
+    const elapsed = Math.floor((now - orderCreatedAt) / 1000);
+    const minutes = Math.floor(elapsed / 60);
+    const seconds = elapsed % 60;
+    document.getElementById('elapsedTime').textContent = 
+        `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
+}
+
+// Fetch latest order status
+async function fetchOrderStatus() {
+    try {
+        const response = await fetch(trackUrl);
+        const data = await response.json();
+        
+        if (data.status !== currentStatus) {
+            currentStatus = data.status;
+            updateUI(data);
+        }
+        
+        // Update progress bar
+        document.getElementById('progressFill').style.width = data.progress + '%';
+        
+    } catch (error) {
+        console.error('Error fetching order status:', error);
+    }
+}
+
+function updateUI(data) {
+    // Update status icon and messages
+    const statusIcons = {
+        'paid': '🎫',
+        'preparing': '🍳',
+        'ready': '🔔',
+        'completed': '✨'
+    };
+    
+    const statusTitles = {
+        'paid': 'Order Received!',
+        'preparing': "We're Cooking!",
+        'ready': 'Ready for Pickup!',
+        'completed': 'Order Complete'
+    };
+    
+    const statusMessages = {
+        'paid': "We've received your order and will start preparing it soon.",
+        'preparing': 'Your delicious meal is being prepared with care.',
+        'ready': 'Your order is ready! Come pick it up at the counter.',
+        'completed': 'Thanks for dining with us! See you next time.'
+    };
+    
+    document.getElementById('statusIcon').textContent = statusIcons[data.status] || '⏳';
+    document.getElementById('statusTitle').textContent = statusTitles[data.status] || 'Processing';
+    document.getElementById('statusMessage').textContent = statusMessages[data.status] || 'Your order is being processed.';
+    
+    // Update progress steps
+    const steps = document.querySelectorAll('.step');
+    const statusOrder = ['paid', 'preparing', 'ready', 'completed'];
+    const currentIndex = statusOrder.indexOf(data.status);
+    
+    steps.forEach((step, index) => {
+        if (index <= currentIndex) {
+            step.classList.add('active');
+        } else {
+            step.classList.remove('active');
+        }
+    });
+    
+    // Update timeline
+    if (data.events && data.events.length > 0) {
+        const timeline = document.getElementById('timeline');
+        timeline.innerHTML = data.events.map(event => `
+            <div class="timeline-event">
+                <div class="timeline-dot"></div>
+                <div class="timeline-content">
+                    <span class="event-status">${event.status.charAt(0).toUpperCase() + event.status.slice(1)}</span>
+                    <span class="event-time">${new Date(event.created_at).toLocaleTimeString([], {hour: '2-digit', minute: '2-digit'})}</span>
+                    ${event.notes ? `<span class="event-notes">${event.notes}</span>` : ''}
+                </div>
+            </div>
+        `).join('');
+    }
+    
+    // Play notification sound on status change (optional)
+    if (data.status === 'ready') {
+        // You could add a notification sound here
+        document.title = '🔔 Order Ready! - Crispy Clucker\'s';
+    }
+}
+
+// Start updates
+updateElapsedTime();
+setInterval(updateElapsedTime, 1000);
+
+// Poll for status updates every 5 seconds
+fetchOrderStatus();
+setInterval(fetchOrderStatus, 5000);
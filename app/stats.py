@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import object_session
+from app import db
+from app.cache import Cache, invalidate_tags
+from app.locations import current_location
+from app.models import Order, StaffClockIn, User
+
+logger = logging.getLogger(__name__)
+
+STAFF_ROLES = ('staff', 'manager', 'admin')
+
+stats_cache = Cache('stats', 'STATS_CACHE_TTL')
+
+
+def stats_tag(location):
+    return f'stats:{location}'
+
+
+def _load_stats():
+    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    rows = db.session.query(
+        Order.status,
+        func.count(Order.id),
+        func.sum(case((Order.created_at >= today_start, 1), else_=0)),
+        func.sum(Order.total_cents)
+    ).group_by(Order.status).all()
+
+    counts = {status: count for status, count, _, _ in rows}
+    today = {status: today_count or 0 for status, _, today_count, _ in rows}
+
+    # Users and clock-ins live in the main database, so they get their own query
+    staff_count, active_staff = db.session.query(
+        select(func.count(User.id)).where(User.role.in_(STAFF_ROLES)).scalar_subquery(),
+        select(func.count(StaffClockIn.id)).where(StaffClockIn.clock_out.is_(None)).scalar_subquery()
+    ).one()
+
+    return {
+        'total_orders': sum(counts.values()),
+        'pending': counts.get('pending', 0) + counts.get('paid', 0),
+        'preparing': counts.get('preparing', 0),
+        'ready': counts.get('ready', 0),
+        'completed_today': today.get('completed', 0),
+        'orders_today': sum(today.values()),
+        'revenue_cents': sum(revenue or 0 for status, _, _, revenue in rows if status != 'cancelled'),
+        'staff_count': staff_count,
+        'active_staff': active_staff
+    }
+
+
+def get_stats():
+    """Order and staff counters for the current location, cached briefly
+
+    All order counts come from one GROUP BY status query. Results are
+    shared by the dashboard, its stats poll and the home page for
+    STATS_CACHE_TTL seconds in the stats cache region, and dropped early
+    when an order or clock-in changes.
+    """
+    location = current_location()
+    return stats_cache.get_or_load(location, _load_stats, tags=[stats_tag(location)])
+
+
+def invalidate_stats(location=None, session=None):
+    """Drop a location's cached stats (the current one by default)"""
+    invalidate_tags(stats_tag(location or current_location()), session=session)
+
+
+@event.listens_for(Order, 'after_insert')
+@event.listens_for(Order, 'after_update')
+@event.listens_for(Order, 'after_delete')
+@event.listens_for(StaffClockIn, 'after_insert')
+@event.listens_for(StaffClockIn, 'after_update')
+@event.listens_for(StaffClockIn, 'after_delete')
+def _counted_row_changed(mapper, connection, target):
+    invalidate_stats(target.location, session=object_session(target))
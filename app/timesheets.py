@@ -0,0 +1,277 @@
+import logging
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, literal, union_all, func, case, or_, and_, delete, insert, event, inspect
+from sqlalchemy.exc import DBAPIError
+from app import db
+from app.models import StaffClockIn, TimesheetDay, TimesheetRollup, User
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on days computed by one SQL statement
+MAX_DAYS_PER_QUERY = 62
+
+
+def _is_sqlite():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def _greatest(a, b):
+    return func.max(a, b) if _is_sqlite() else func.greatest(a, b)
+
+
+def _least(a, b):
+    return func.min(a, b) if _is_sqlite() else func.least(a, b)
+
+
+def _seconds_between(start, end):
+    if _is_sqlite():
+        return (func.julianday(end) - func.julianday(start)) * 86400
+    return func.extract('epoch', end - start)
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def compute_daily_hours(start_day, end_day, user_id=None, now=None):
+    """Compute worked seconds per staff member per day in a single query
+
+    Covers days in [start_day, end_day). Shifts are clipped to day
+    boundaries, open shifts run until `now`, and time a staff member was
+    already clocked in for (overlapping records) is only counted once.
+    Breaks are attributed to the day the shift started. Hours are summed
+    across locations, since a staff member is paid for every truck they
+    worked.
+
+    Returns {(user_id, day): {'worked_seconds', 'break_minutes', 'shifts'}}.
+    """
+    now = now or datetime.utcnow()
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days)]
+    if not days:
+        return {}
+    if len(days) > MAX_DAYS_PER_QUERY:
+        raise ValueError('At most {} days per query'.format(MAX_DAYS_PER_QUERY))
+
+    window_start = _day_start(days[0])
+    window_end = _day_start(days[-1] + timedelta(days=1))
+
+    day_rows = union_all(*[
+        select(
+            literal(i).label('idx'),
+            literal(_day_start(day), db.DateTime).label('day_start'),
+            literal(_day_start(day + timedelta(days=1)), db.DateTime).label('day_end')
+        )
+        for i, day in enumerate(days)
+    ]).cte('days')
+
+    shift_end = func.coalesce(StaffClockIn.clock_out, literal(now, db.DateTime))
+    # Latest end of any earlier shift by the same person; time before it is already counted
+    covered_until = func.max(shift_end).over(
+        partition_by=StaffClockIn.user_id,
+        order_by=(StaffClockIn.clock_in, StaffClockIn.id),
+        rows=(None, -1)
+    )
+    shift_query = select(
+        StaffClockIn.user_id,
+        StaffClockIn.clock_in,
+        shift_end.label('shift_end'),
+        covered_until.label('covered_until'),
+        func.coalesce(StaffClockIn.break_minutes, 0).label('break_minutes')
+    ).where(
+        StaffClockIn.clock_in < window_end,
+        or_(StaffClockIn.clock_out > window_start, StaffClockIn.clock_out.is_(None))
+    )
+    if user_id is not None:
+        shift_query = shift_query.where(StaffClockIn.user_id == user_id)
+    shifts = shift_query.subquery('shifts')
+
+    effective_start = _greatest(shifts.c.clock_in, func.coalesce(shifts.c.covered_until, shifts.c.clock_in))
+    clipped_start = _greatest(effective_start, day_rows.c.day_start)
+    clipped_end = _least(shifts.c.shift_end, day_rows.c.day_end)
+    started_today = and_(shifts.c.clock_in >= day_rows.c.day_start, shifts.c.clock_in < day_rows.c.day_end)
+
+    query = select(
+        shifts.c.user_id,
+        day_rows.c.idx,
+        func.sum(case((clipped_end > clipped_start, _seconds_between(clipped_start, clipped_end)), else_=0)),
+        func.sum(case((started_today, shifts.c.break_minutes), else_=0)),
+        func.sum(case((started_today, 1), else_=0))
+    ).select_from(shifts).join(
+        day_rows,
+        and_(shifts.c.clock_in < day_rows.c.day_end, shifts.c.shift_end > day_rows.c.day_start)
+    ).group_by(shifts.c.user_id, day_rows.c.idx).execution_options(all_locations=True)
+
+    results = {}
+    for uid, idx, seconds, break_minutes, shift_count in db.session.execute(query):
+        results[(uid, days[idx])] = {
+            'worked_seconds': int(round(seconds or 0)),
+            'break_minutes': int(break_minutes or 0),
+            'shifts': int(shift_count or 0)
+        }
+    return results
+
+
+def _closable_days(days, now):
+    """Days that are over and have no open shift whose break is still unknown"""
+    past = [day for day in days if _day_start(day + timedelta(days=1)) <= now]
+    if not past:
+        return set()
+    open_starts = db.session.query(StaffClockIn.clock_in).execution_options(all_locations=True).filter(
+        StaffClockIn.clock_out.is_(None),
+        StaffClockIn.clock_in < _day_start(past[-1] + timedelta(days=1))
+    ).all()
+    open_days = {clock_in.date() for (clock_in,) in open_starts}
+    return {day for day in past if day not in open_days}
+
+
+def get_daily_hours(start_day, end_day, user_id=None, now=None):
+    """Per-staff daily hours for [start_day, end_day), served from rollups where possible
+
+    Closed days are computed once and frozen in TimesheetRollup; the
+    current day and days with an open shift are always computed live.
+    """
+    now = now or datetime.utcnow()
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days)]
+    results = {}
+
+    for offset in range(0, len(days), MAX_DAYS_PER_QUERY):
+        chunk = days[offset:offset + MAX_DAYS_PER_QUERY]
+        chunk_start, chunk_end = chunk[0], chunk[-1] + timedelta(days=1)
+
+        rolled_up = {d for (d,) in db.session.query(TimesheetDay.day).filter(
+            TimesheetDay.day >= chunk_start, TimesheetDay.day < chunk_end
+        )}
+        rollup_query = TimesheetRollup.query.filter(
+            TimesheetRollup.day >= chunk_start, TimesheetRollup.day < chunk_end
+        )
+        if user_id is not None:
+            rollup_query = rollup_query.filter(TimesheetRollup.user_id == user_id)
+        for rollup in rollup_query:
+            results[(rollup.user_id, rollup.day)] = {
+                'worked_seconds': rollup.worked_seconds,
+                'break_minutes': rollup.break_minutes,
+                'shifts': rollup.shifts
+            }
+
+        missing = [day for day in chunk if day not in rolled_up]
+        if not missing:
+            continue
+
+        closable = _closable_days(missing, now)
+        if closable:
+            # Freeze closed days for every staff member, not just the one asked for
+            computed = compute_daily_hours(min(closable), max(closable) + timedelta(days=1), now=now)
+            _store_rollups(closable, computed)
+            for (uid, day), row in computed.items():
+                if day in closable and (user_id is None or uid == user_id):
+                    results[(uid, day)] = row
+
+        live = [day for day in missing if day not in closable]
+        if live:
+            computed = compute_daily_hours(min(live), max(live) + timedelta(days=1), user_id=user_id, now=now)
+            for (uid, day), row in computed.items():
+                if day in live:
+                    results[(uid, day)] = row
+
+    return results
+
+
+def _store_rollups(days, computed):
+    """Freeze closed days in a transaction of their own
+
+    Called while serving GETs, so it must not commit or roll back the
+    request's session.
+    """
+    days = sorted(days)
+    rollups = [dict(row, day=day, user_id=uid) for (uid, day), row in computed.items() if day in days]
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(delete(TimesheetRollup).where(TimesheetRollup.day.in_(days)))
+            conn.execute(delete(TimesheetDay).where(TimesheetDay.day.in_(days)))
+            conn.execute(insert(TimesheetDay), [{'day': day} for day in days])
+            if rollups:
+                conn.execute(insert(TimesheetRollup), rollups)
+    except DBAPIError:
+        # e.g. a concurrent request froze the same days first; they are
+        # computed live until a later request stores them
+        logger.warning('Timesheet rollups for %d days not stored', len(days), exc_info=True)
+        return
+    logger.info('Timesheet rollups stored for %d days', len(days))
+
+
+def period_start(day, period):
+    """First day of the day/week period containing `day` (weeks start Monday)"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def get_timesheet(start_day, end_day, period='day', user_id=None, now=None):
+    """Hours per staff member per period, newest period first"""
+    daily = get_daily_hours(start_day, end_day, user_id=user_id, now=now)
+
+    totals = {}
+    for (uid, day), row in daily.items():
+        key = (uid, period_start(day, period))
+        total = totals.setdefault(key, {'worked_seconds': 0, 'break_minutes': 0, 'shifts': 0})
+        for field in total:
+            total[field] += row[field]
+
+    names = {}
+    user_ids = {uid for uid, _ in totals}
+    if user_ids:
+        names = {
+            u.id: u.name or u.email
+            for u in User.query.with_entities(User.id, User.name, User.email).filter(User.id.in_(user_ids))
+        }
+
+    rows = []
+    for (uid, start), total in totals.items():
+        hours = total['worked_seconds'] / 3600 - total['break_minutes'] / 60
+        rows.append({
+            'user_id': uid,
+            'user_name': names.get(uid),
+            'period': period,
+            'period_start': start.isoformat(),
+            'hours_worked': round(max(hours, 0), 2),
+            'break_minutes': total['break_minutes'],
+            'shifts': total['shifts']
+        })
+    rows.sort(key=lambda r: (r['period_start'], r['user_name'] or ''), reverse=True)
+    return rows
+
+
+def _touched_days(target):
+    """Days whose totals depend on a clock record, before and after the change"""
+    state = inspect(target)
+    starts = [target.clock_in] + list(state.attrs.clock_in.history.deleted)
+    ends = [target.clock_out or datetime.utcnow()] + [
+        value or datetime.utcnow() for value in state.attrs.clock_out.history.deleted
+    ]
+    starts = [value for value in starts if value is not None]
+    if not starts:
+        return None, None
+    return min(starts).date(), max(ends).date()
+
+
+@event.listens_for(StaffClockIn, 'after_insert')
+@event.listens_for(StaffClockIn, 'after_update')
+@event.listens_for(StaffClockIn, 'after_delete')
+def _invalidate_rollups(mapper, connection, target):
+    first, last = _touched_days(target)
+    if first is None:
+        return
+    connection.execute(delete(TimesheetDay.__table__).where(
+        TimesheetDay.day >= first, TimesheetDay.day <= last
+    ))
+    connection.execute(delete(TimesheetRollup.__table__).where(
+        TimesheetRollup.day >= first, TimesheetRollup.day <= last
+    ))
+
+
+def parse_day(value, default):
+    """Parse a YYYY-MM-DD query parameter, falling back to `default`"""
+    try:
+        return date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
@@ -10,3 +10,74 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+
+    # Seconds a worker may serve its cached menu before reloading it
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 30))
+
+    # Kitchen admission control. KITCHEN_SLOT_CAPACITY is the number of
+    # paid/preparing orders allowed per pickup slot; 0 disables the limit.
+    KITCHEN_SLOT_MINUTES = int(os.getenv('KITCHEN_SLOT_MINUTES', 15))
+    KITCHEN_SLOT_CAPACITY = int(os.getenv('KITCHEN_SLOT_CAPACITY', 0))
+    KITCHEN_LEAD_MINUTES = int(os.getenv('KITCHEN_LEAD_MINUTES', 15))
+    KITCHEN_SLOTS_AHEAD = int(os.getenv('KITCHEN_SLOTS_AHEAD', 8))
+    KITCHEN_RESYNC_SECONDS = int(os.getenv('KITCHEN_RESYNC_SECONDS', 30))
+
+    # Seconds the dashboard/home counters are shared before recounting
+    STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 5))
+
+    # Cache layer: 'memory' (per-process LRU), 'redis' (shared by all
+    # workers, needs the redis package and CACHE_URL), 'stub' (in-process
+    # stand-in for a shared backend) or 'none'. The TTLs are in seconds;
+    # 0 turns a region off.
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+    CACHE_URL = os.getenv('CACHE_URL', '')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    CACHE_USER_TTL = int(os.getenv('CACHE_USER_TTL', 300))
+    CACHE_TRACKING_TTL = int(os.getenv('CACHE_TRACKING_TTL', 10))
+    CACHE_ANALYTICS_TTL = int(os.getenv('CACHE_ANALYTICS_TTL', 60))
+
+    # Dashboard snapshots: every staff screen at a location is served from
+    # one precomputed document, built on demand after changes. One
+    # materializer per deployment (`flask dashboard materialize`, or the
+    # in-app thread with DASHBOARD_SNAPSHOT_THREAD on a single process)
+    # rebuilds it every DASHBOARD_SNAPSHOT_INTERVAL seconds;
+    # DASHBOARD_SNAPSHOT_TTL bounds its age either way. Without a shared
+    # cache it is capped at STATS_CACHE_TTL, since a worker only sees
+    # other workers' changes once its snapshot expires.
+    DASHBOARD_SNAPSHOT_INTERVAL = int(os.getenv('DASHBOARD_SNAPSHOT_INTERVAL', 15))
+    DASHBOARD_SNAPSHOT_THREAD = os.getenv('DASHBOARD_SNAPSHOT_THREAD', 'false').lower() in ('1', 'true', 'yes')
+    DASHBOARD_SNAPSHOT_TTL = int(os.getenv('DASHBOARD_SNAPSHOT_TTL', 60))
+
+    # Response compression (gzip, or brotli when installed)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+
+    # Offline orders: journal path enables local capture when the main DB is down
+    OFFLINE_JOURNAL_PATH = os.getenv('OFFLINE_JOURNAL_PATH', '')
+    OFFLINE_RETRY_SECONDS = int(os.getenv('OFFLINE_RETRY_SECONDS', 30))
+    OFFLINE_SYNC_INTERVAL = int(os.getenv('OFFLINE_SYNC_INTERVAL', 15))
+    # Sync from a thread inside the app; set on exactly one process, or run `flask offline watch`
+    OFFLINE_SYNC_THREAD = os.getenv('OFFLINE_SYNC_THREAD', 'false').lower() in ('1', 'true', 'yes')
+    OFFLINE_SYNC_BATCH_SIZE = int(os.getenv('OFFLINE_SYNC_BATCH_SIZE', 50))
+    OFFLINE_SYNC_MAX_ATTEMPTS = int(os.getenv('OFFLINE_SYNC_MAX_ATTEMPTS', 5))
+
+    # Locations (trucks): the first is the default. Rows from before
+    # locations existed belong to 'main'. LOCATION_DATABASES optionally
+    # gives a location its own database for menu and orders: slug=url,...
+    LOCATIONS = [s.strip() for s in os.getenv('LOCATIONS', 'main').split(',') if s.strip()]
+    LOCATION_DATABASES = os.getenv('LOCATION_DATABASES', '')
+
+    # Read replica for analytics, live stats and tracking polls. Without a
+    # URL, SQLITE_WAL_READ_POOL reads a SQLite database through a separate
+    # read-only pool in WAL mode. Clients that just wrote stay on the
+    # primary for REPLICA_STICKY_SECONDS.
+    REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL', '')
+    SQLITE_WAL_READ_POOL = os.getenv('SQLITE_WAL_READ_POOL', 'false').lower() in ('1', 'true', 'yes')
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FILE_LEVEL = os.getenv('LOG_FILE_LEVEL', 'INFO').upper()
+    LOG_DIR = os.getenv('LOG_DIR', 'logs')
+    LOG_JSON = os.getenv('LOG_JSON', 'false').lower() in ('1', 'true', 'yes')
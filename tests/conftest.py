@@ -0,0 +1,47 @@
+import pytest
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh app on its own SQLite file, with an app context pushed"""
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'crispy.db'}")
+    monkeypatch.setattr(Config, 'LOG_DIR', str(tmp_path / 'logs'))
+    from app import create_app, db
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create and commit a user: make_user(email, role='customer')"""
+    from app import db
+    from app.models import User
+
+    def make(email, role='customer', password='password'):
+        user = User(email=email, name=email.split('@')[0], role=role)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def login(client):
+    """Log `client` in as a user without going through the login form"""
+    def log_in(user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+    return log_in
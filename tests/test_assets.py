@@ -0,0 +1,33 @@
+import json
+import os
+from app.assets import DIST_DIR, MANIFEST_NAME, build_assets, prune_assets
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_rebuilds_keep_files_of_the_previous_manifest_until_pruned(tmp_path):
+    static = str(tmp_path)
+    dist = os.path.join(static, DIST_DIR)
+    _write(os.path.join(static, 'css', 'style.css'), 'body { color: red; }\n' * 50)
+    old = build_assets(static)['css/style.css']
+
+    _write(os.path.join(static, 'css', 'style.css'), 'body { color: blue; }\n' * 50)
+    new = build_assets(static)['css/style.css']
+
+    assert new != old
+    with open(os.path.join(dist, MANIFEST_NAME)) as f:
+        assert json.load(f) == {'css/style.css': new}
+    # Workers still on the old manifest can keep serving its files
+    assert os.path.isfile(os.path.join(dist, old))
+    assert os.path.isfile(os.path.join(dist, old + '.gz'))
+
+    assert prune_assets(static) >= 2
+    assert not os.path.exists(os.path.join(dist, old))
+    assert not os.path.exists(os.path.join(dist, old + '.gz'))
+    assert os.path.isfile(os.path.join(dist, new))
+    assert os.path.isfile(os.path.join(dist, new + '.gz'))
+    assert prune_assets(static) == 0
@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from app import db
+from app.cache import Cache, init_cache, invalidate_tags
+from app.models import StaffCode
+
+region = Cache('test', 'CACHE_TRACKING_TTL')
+
+
+@pytest.fixture(params=['memory', 'stub'])
+def cache(app, request):
+    app.config.update(CACHE_BACKEND=request.param, CACHE_TRACKING_TTL=60)
+    init_cache(app)
+    region.hits = region.misses = region.loads = region.coalesced = region.errors = 0
+    return region
+
+
+def test_concurrent_misses_share_one_load(app, cache):
+    callers = 8
+    start = threading.Barrier(callers)
+    calls = []
+    results = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'value': 42}
+
+    def read():
+        with app.app_context():
+            start.wait()
+            results.append(cache.get_or_load('key', loader))
+
+    threads = [threading.Thread(target=read) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 42}] * callers
+    assert cache.metrics()['coalesced'] == callers - 1
+
+
+def test_failed_load_is_raised_to_every_waiter(app, cache):
+    start = threading.Barrier(3)
+    errors = []
+
+    def loader():
+        time.sleep(0.2)
+        raise RuntimeError('boom')
+
+    def read():
+        with app.app_context():
+            start.wait()
+            try:
+                cache.get_or_load('key', loader)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ['boom'] * 3
+    # Nothing was cached, so the next read loads again
+    assert cache.get_or_load('key', lambda: 'ok') == 'ok'
+
+
+def test_invalidating_a_tag_drops_its_entries(cache):
+    cache.get_or_load('a', lambda: 1, tags=['t'])
+    cache.get_or_load('b', lambda: 2, tags=['other'])
+    invalidate_tags('t')
+    assert cache.get_or_load('a', lambda: 10, tags=['t']) == 10
+    assert cache.get_or_load('b', lambda: 20, tags=['other']) == 2
+
+
+def test_tags_are_invalidated_again_after_commit(cache):
+    db.session.add(StaffCode(code='TAGGED', role='staff'))
+    invalidate_tags('t', session=db.session)
+    # A reader between the change and the commit caches the old value...
+    cache.get_or_load('a', lambda: 'old', tags=['t'])
+    db.session.commit()
+    # ...which the commit drops
+    assert cache.get_or_load('a', lambda: 'new', tags=['t']) == 'new'
+
+
+def test_none_is_not_cached(cache):
+    assert cache.get_or_load('missing', lambda: None) is None
+    assert cache.get_or_load('missing', lambda: 'found') == 'found'
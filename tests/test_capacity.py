@@ -0,0 +1,62 @@
+from datetime import datetime
+import pytest
+from app.capacity import KitchenFullError, kitchen
+
+
+@pytest.fixture
+def slots(app):
+    app.config.update(KITCHEN_SLOT_MINUTES=15, KITCHEN_LEAD_MINUTES=15,
+                      KITCHEN_SLOTS_AHEAD=4, KITCHEN_SLOT_CAPACITY=0)
+    kitchen.reset()
+    yield app.config
+    kitchen.reset()
+
+
+def test_slot_for_floors_to_slot_start(slots):
+    assert kitchen.slot_for(datetime(2026, 5, 1, 12, 14, 59)) == datetime(2026, 5, 1, 12, 0)
+    assert kitchen.slot_for(datetime(2026, 5, 1, 12, 15)) == datetime(2026, 5, 1, 12, 15)
+
+
+def test_slots_that_do_not_divide_an_hour_stay_evenly_spaced(slots):
+    slots['KITCHEN_SLOT_MINUTES'] = 7
+    before_hour = kitchen.slot_for(datetime(2026, 5, 1, 11, 58))
+    after_hour = kitchen.slot_for(datetime(2026, 5, 1, 12, 2))
+    assert before_hour == datetime(2026, 5, 1, 11, 54)
+    assert after_hour == datetime(2026, 5, 1, 12, 1)
+    assert kitchen.next_slot(before_hour) == after_hour
+
+
+def test_last_slot_of_the_day_ends_at_midnight(slots):
+    slots['KITCHEN_SLOT_MINUTES'] = 7
+    last = kitchen.slot_for(datetime(2026, 5, 1, 23, 58))
+    assert last == datetime(2026, 5, 1, 23, 55)
+    assert kitchen.next_slot(last) == datetime(2026, 5, 2, 0, 0)
+
+
+def test_earliest_slot_rounds_up_past_the_lead_time(slots):
+    now = datetime(2026, 5, 1, 12, 1, 30)
+    assert kitchen.admit(now=now) == datetime(2026, 5, 1, 12, 30)
+
+
+def test_earliest_slot_on_a_boundary_is_kept(slots):
+    now = datetime(2026, 5, 1, 12, 0)
+    assert kitchen.admit(now=now) == datetime(2026, 5, 1, 12, 15)
+
+
+def test_requested_slot_within_horizon_is_used(slots):
+    now = datetime(2026, 5, 1, 12, 0)
+    assert kitchen.admit(datetime(2026, 5, 1, 13, 0), now=now) == datetime(2026, 5, 1, 13, 0)
+    # Past KITCHEN_SLOTS_AHEAD the request is ignored
+    assert kitchen.admit(datetime(2026, 5, 1, 13, 30), now=now) == datetime(2026, 5, 1, 12, 15)
+
+
+def test_full_slot_offers_the_next_one_with_room(slots):
+    slots['KITCHEN_SLOT_CAPACITY'] = 1
+    now = datetime(2026, 5, 1, 12, 0)
+    assert kitchen.admit(now=now) == datetime(2026, 5, 1, 12, 15)
+    with pytest.raises(KitchenFullError) as full:
+        kitchen.admit(now=now)
+    assert full.value.offer == datetime(2026, 5, 1, 12, 30)
+
+    kitchen.release(datetime(2026, 5, 1, 12, 15))
+    assert kitchen.admit(now=now) == datetime(2026, 5, 1, 12, 15)
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+from app import offline
+from app.models import MenuItem, Order
+from app.offline import OrderJournal, primary
+from app.routes import cart as cart_routes
+
+
+@pytest.fixture
+def journal(app, tmp_path, monkeypatch):
+    journal = OrderJournal(str(tmp_path / 'journal.db'))
+    monkeypatch.setattr(offline, '_journal', journal)
+    primary.mark_online()
+    yield journal
+    primary.mark_online()
+
+
+@pytest.fixture
+def cart_client(client):
+    item = MenuItem.query.first()
+    with client.session_transaction() as session:
+        session['cart'] = [{'id': item.id, 'name': item.name, 'price_cents': item.price_cents,
+                            'image_url': item.image_url, 'quantity': 1}]
+    return client
+
+
+def _failing_place_order(error):
+    def place_order(*args, **kwargs):
+        raise error
+    return place_order
+
+
+def _checkout(client):
+    return client.post('/checkout', data={'name': 'Sam', 'email': 'sam@example.com', 'phone': '555'})
+
+
+def test_unreachable_database_journals_the_order(journal, cart_client, monkeypatch):
+    error = OperationalError('INSERT', {}, Exception('unable to open database file'))
+    monkeypatch.setattr(cart_routes, 'place_order', _failing_place_order(error))
+
+    response = _checkout(cart_client)
+    assert response.status_code == 200
+    assert journal.pending_count() == 1
+    assert primary.is_offline()
+
+
+@pytest.mark.parametrize('error', [
+    IntegrityError('INSERT', {}, Exception('UNIQUE constraint failed: order.order_number')),
+    DataError('INSERT', {}, Exception('value too long')),
+])
+def test_bad_order_fails_without_going_offline(journal, cart_client, monkeypatch, error):
+    monkeypatch.setattr(cart_routes, 'place_order', _failing_place_order(error))
+
+    with pytest.raises(type(error)):
+        _checkout(cart_client)
+    assert journal.pending_count() == 0
+    assert not primary.is_offline()
+
+
+def test_checkout_places_the_order(journal, cart_client):
+    response = _checkout(cart_client)
+    assert response.status_code == 302
+    assert Order.query.one().customer_name == 'Sam'
+    assert journal.pending_count() == 0
+
+
+def test_any_checkout_failure_releases_the_kitchen_slot(journal, cart_client, monkeypatch):
+    kitchen = cart_routes.kitchen
+    admit, release = kitchen.admit, kitchen.release
+    admitted, released = [], []
+
+    def recording_admit(*args):
+        admitted.append(admit(*args))
+        return admitted[-1]
+
+    def recording_release(slot):
+        released.append(slot)
+        release(slot)
+
+    monkeypatch.setattr(kitchen, 'admit', recording_admit)
+    monkeypatch.setattr(kitchen, 'release', recording_release)
+    monkeypatch.setattr(cart_routes, 'place_order', _failing_place_order(ValueError('bad cart')))
+
+    with pytest.raises(ValueError):
+        _checkout(cart_client)
+    assert admitted and released == admitted
@@ -0,0 +1,123 @@
+import gzip
+import zlib
+import pytest
+from werkzeug.test import create_environ
+from app.compression import CompressionMiddleware
+
+BODY = b'crispy chicken ' * 100
+
+
+class _Body:
+    """A response body that records whether the server closed it"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def _wsgi_app(chunks, status='200 OK', headers=None, length=True):
+    body = _Body(chunks)
+
+    def app(environ, start_response):
+        response_headers = [('Content-Type', 'text/html; charset=utf-8')] + list(headers or [])
+        if length:
+            response_headers.append(('Content-Length', str(sum(len(c) for c in chunks))))
+        start_response(status, response_headers)
+        return body
+    return app, body
+
+
+def _call(app, method='GET', accept='gzip', min_size=500):
+    environ = create_environ('/', method=method, headers={'Accept-Encoding': accept})
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(headers)
+
+    result = CompressionMiddleware(app, min_size=min_size)(environ, start_response)
+    return response, result
+
+
+def test_known_length_is_compressed_with_exact_length():
+    app, body = _wsgi_app([BODY[:700], BODY[700:]])
+    response, result = _call(app)
+    data = b''.join(result)
+
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+    assert response['headers']['Content-Length'] == str(len(data))
+    assert gzip.decompress(data) == BODY
+    assert body.closed
+
+
+def test_streams_are_flushed_per_chunk_and_closed():
+    app, body = _wsgi_app([b'first chunk ' * 10, b'second chunk ' * 10], length=False)
+    response, result = _call(app)
+    assert 'Content-Length' not in response['headers']
+
+    decompressor = zlib.decompressobj(31)
+    first = next(result)
+    # A sync flush lets the client decode the first chunk before the rest exists
+    assert decompressor.decompress(first) == b'first chunk ' * 10
+    rest = b''.join(result)
+    assert decompressor.decompress(rest) == b'second chunk ' * 10
+    assert body.closed
+
+
+def test_closing_an_unfinished_stream_closes_the_body():
+    app, body = _wsgi_app([b'a' * 600, b'b' * 600], length=False)
+    _, result = _call(app)
+    next(result)
+    result.close()
+    assert body.closed
+
+
+def test_small_responses_are_left_alone():
+    app, _ = _wsgi_app([b'tiny'])
+    response, result = _call(app)
+    assert 'Content-Encoding' not in response['headers']
+    assert b''.join(result) == b'tiny'
+
+
+@pytest.mark.parametrize('status, headers', [
+    ('200 OK', [('Content-Encoding', 'br')]),
+    ('206 Partial Content', [('Content-Range', f'bytes 0-{len(BODY) - 1}/9999')]),
+    ('304 Not Modified', []),
+])
+def test_encoded_partial_and_not_modified_responses_are_left_alone(status, headers):
+    app, _ = _wsgi_app([BODY], status=status, headers=headers)
+    response, result = _call(app)
+    assert response['headers'].get('Content-Encoding') in (None, 'br')
+    assert response['headers']['Content-Length'] == str(len(BODY))
+    assert b''.join(result) == BODY
+
+
+def test_head_requests_are_left_alone():
+    app, _ = _wsgi_app([BODY])
+    response, _ = _call(app, method='HEAD')
+    assert 'Content-Encoding' not in response['headers']
+    assert response['headers']['Content-Length'] == str(len(BODY))
+
+
+def test_clients_without_gzip_get_identity():
+    app, _ = _wsgi_app([BODY])
+    response, result = _call(app, accept='identity')
+    assert 'Content-Encoding' not in response['headers']
+    assert b''.join(result) == BODY
+
+
+def test_strong_etags_are_weakened():
+    app, _ = _wsgi_app([BODY], headers=[('ETag', '"abc"')])
+    response, _ = _call(app)
+    assert response['headers']['ETag'] == 'W/"abc"'
+
+    app, _ = _wsgi_app([BODY], headers=[('ETag', 'W/"abc"')])
+    response, _ = _call(app)
+    assert response['headers']['ETag'] == 'W/"abc"'
@@ -0,0 +1,63 @@
+from app import db
+from app.dashboard import build_snapshot, get_analytics, get_snapshot
+from app.models import MenuItem
+from app.orders import place_order
+
+
+def _place(item, quantity=1):
+    cart = [{'id': item.id, 'name': item.name, 'price_cents': item.price_cents, 'quantity': quantity}]
+    order, _ = place_order(cart, {'name': 'Sam'})
+    db.session.commit()
+    return order
+
+
+def test_snapshot_analytics_match_live_analytics(app):
+    item = MenuItem.query.first()
+    _place(item, quantity=2)
+
+    analytics = get_snapshot().analytics
+    live = get_analytics()
+    assert analytics == live
+    assert all(isinstance(hour, int) for hour in analytics['hourly_orders'])
+    assert analytics['top_items'] == [(item.name, 2)]
+
+
+def test_snapshot_is_rebuilt_after_an_order(app):
+    item = MenuItem.query.first()
+    get_snapshot()
+    order = _place(item)
+    assert order.order_number in [o.order_number for o in get_snapshot().orders]
+
+
+def test_manager_dashboard_renders_from_snapshot(app, client, make_user, login):
+    item = MenuItem.query.first()
+    order = _place(item)
+    assert order.order_number in build_snapshot()
+
+    login(make_user('boss@example.com', role='manager'))
+    response = client.get('/manager')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert order.order_number in page
+    assert item.name in page
+
+
+def test_other_workers_see_changes_within_the_stats_ttl(app, monkeypatch):
+    from app import create_app
+    from app import cache
+
+    other = create_app()
+    assert app.config['DASHBOARD_SNAPSHOT_TTL'] == app.config['STATS_CACHE_TTL']
+    get_snapshot()
+    with other.app_context():
+        order = _place(MenuItem.query.first())
+        order_number = order.order_number
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # This worker's memory cache never heard about the other's order
+    assert order_number not in [o.order_number for o in get_snapshot().orders]
+    now = cache.time.monotonic() + app.config['STATS_CACHE_TTL'] + 1
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now)
+    assert order_number in [o.order_number for o in get_snapshot().orders]
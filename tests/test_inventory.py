@@ -0,0 +1,92 @@
+import threading
+import pytest
+from app import db
+from app.inventory import OutOfStockError, reserve_stock, set_stock
+from app.models import MenuItem
+
+
+@pytest.fixture
+def item(app):
+    item = MenuItem.query.first()
+    set_stock(item, 3)
+    db.session.commit()
+    return item
+
+
+def _line(item, quantity):
+    return {'id': item.id, 'name': item.name, 'quantity': quantity}
+
+
+def _stock(item_id):
+    db.session.expire_all()
+    return db.session.get(MenuItem, item_id)
+
+
+def test_reserve_decrements_and_keeps_item_available(item):
+    assert reserve_stock([_line(item, 2)]) == []
+    db.session.commit()
+    stored = _stock(item.id)
+    assert (stored.stock, stored.available) == (1, True)
+
+
+def test_selling_the_last_units_marks_item_unavailable(item):
+    # The CASE compares against the stock before this UPDATE subtracts from it
+    assert reserve_stock([_line(item, 1), _line(item, 2)]) == [item.id]
+    db.session.commit()
+    stored = _stock(item.id)
+    assert (stored.stock, stored.available) == (0, False)
+
+
+def test_reserving_more_than_stock_raises_and_changes_nothing(item):
+    with pytest.raises(OutOfStockError) as error:
+        reserve_stock([_line(item, 4)])
+    assert error.value.item_id == item.id
+    db.session.rollback()
+    assert _stock(item.id).stock == 3
+
+
+def test_non_strict_reserve_skips_unfillable_lines(item):
+    other = MenuItem.query.filter(MenuItem.id != item.id).first()
+    assert reserve_stock([_line(item, 4), _line(other, 1)], strict=False) == []
+    db.session.commit()
+    assert _stock(item.id).stock == 3
+
+
+def test_untracked_items_only_need_to_be_available(item):
+    set_stock(item, None)
+    db.session.commit()
+    assert reserve_stock([_line(item, 50)]) == []
+    db.session.commit()
+    stored = _stock(item.id)
+    assert (stored.stock, stored.available) == (None, True)
+
+
+def test_concurrent_checkouts_never_oversell(app, item):
+    buyers = 8
+    start = threading.Barrier(buyers)
+    outcomes = []
+    line = _line(item, 1)
+
+    def buy():
+        with app.app_context():
+            start.wait()
+            try:
+                reserve_stock([line])
+                db.session.commit()
+                outcomes.append('sold')
+            except OutOfStockError:
+                db.session.rollback()
+                outcomes.append('refused')
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=buy) for _ in range(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count('sold') == 3
+    assert outcomes.count('refused') == buyers - 3
+    stored = _stock(item.id)
+    assert (stored.stock, stored.available) == (0, False)
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import text
+from app import db
+from app.locations import location_bind_key, use_location
+from app.models import MenuItem, Order, StaffClockIn
+from app.orders import find_order, place_order
+from config import Config
+
+
+@pytest.fixture(autouse=True)
+def three_locations(tmp_path, monkeypatch):
+    """main and north share the default database; south has its own"""
+    monkeypatch.setattr(Config, 'LOCATIONS', ['main', 'north', 'south'])
+    monkeypatch.setattr(Config, 'LOCATION_DATABASES', f"south=sqlite:///{tmp_path / 'south.db'}")
+    yield
+    # The extension keeps a metadata per bind key it has seen, across apps
+    db.metadatas.pop(location_bind_key('south'), None)
+
+
+def _place(location):
+    with use_location(location):
+        item = MenuItem.query.first()
+        cart = [{'id': item.id, 'name': item.name, 'price_cents': item.price_cents, 'quantity': 1}]
+        order, _ = place_order(cart, {'name': 'Sam'})
+        db.session.commit()
+        return order.order_number
+
+
+def test_queries_only_see_the_current_location(app):
+    main_order, north_order = _place('main'), _place('north')
+
+    with use_location('north'):
+        assert [o.order_number for o in Order.query.all()] == [north_order]
+        everywhere = Order.query.execution_options(all_locations=True).all()
+    assert {o.order_number for o in everywhere} == {main_order, north_order}
+
+
+def test_location_bound_rows_go_to_the_location_database(app):
+    south_order = _place('south')
+
+    with db.engines[location_bind_key('south')].connect() as conn:
+        assert conn.execute(text('SELECT order_number FROM "order"')).scalars().all() == [south_order]
+    with db.engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM "order"')).scalar() == 0
+    with use_location('main'):
+        assert Order.query.execution_options(all_locations=True).count() == 0
+
+
+def test_find_order_looks_in_every_location(app):
+    north_order, south_order = _place('north'), _place('south')
+
+    with use_location('main'):
+        assert find_order(north_order)[0] == 'north'
+        location, order_id = find_order(south_order)
+    assert location == 'south'
+    with use_location('south'):
+        assert db.session.get(Order, order_id).order_number == south_order
+    assert find_order('NOPE') is None
+
+
+def test_staff_cannot_clock_in_at_two_locations(app, client, make_user, login):
+    login(make_user('cook@example.com', role='staff'))
+    client.post('/manager/clock-in')
+    client.get('/?location=north')
+    response = client.post('/manager/clock-in', follow_redirects=True)
+
+    assert 'already clocked in' in response.get_data(as_text=True)
+    assert StaffClockIn.query.execution_options(all_locations=True).count() == 1
@@ -0,0 +1,73 @@
+import sqlite3
+import pytest
+from app import db
+from app.models import MenuItem, Order
+from app.offline import OrderJournal, sync_journal
+
+
+@pytest.fixture
+def journal(app, tmp_path):
+    return OrderJournal(str(tmp_path / 'journal.db'), max_attempts=2)
+
+
+@pytest.fixture
+def cart(app):
+    item = MenuItem.query.first()
+    return [{'id': item.id, 'name': item.name, 'price_cents': item.price_cents, 'quantity': 2}]
+
+
+def test_replay_creates_orders_with_journaled_numbers(journal, cart):
+    _, number = journal.append(cart, {'name': 'Sam'})
+    assert sync_journal(journal) == 1
+
+    order = Order.query.filter_by(order_number=number).one()
+    assert order.payment_status == 'offline'
+    assert order.total_cents == cart[0]['price_cents'] * 2
+    assert journal.pending_count() == 0
+
+
+def test_replay_after_a_lost_journal_update_does_not_duplicate(journal, cart):
+    journal.append(cart, {'name': 'Sam'})
+    sync_journal(journal)
+    # The orders committed but the journal never heard about it
+    with sqlite3.connect(journal.path) as conn:
+        conn.execute('UPDATE journal SET synced_at = NULL')
+
+    assert sync_journal(journal) == 1
+    assert Order.query.count() == 1
+    assert journal.pending_count() == 0
+
+
+def test_taken_order_number_gets_a_fresh_one(journal, cart):
+    _, number = journal.append(cart, {'name': 'Sam'})
+    with sqlite3.connect(journal.path) as conn:
+        conn.execute('INSERT INTO journal (source_key, order_number, payload, created_at) '
+                     'SELECT source_key || \'-2\', order_number, payload, created_at FROM journal')
+
+    assert sync_journal(journal) == 2
+    numbers = {o.order_number for o in Order.query}
+    assert len(numbers) == 2 and number in numbers
+
+
+def test_bad_entry_is_quarantined_without_holding_back_the_rest(journal, cart):
+    journal.append(cart, {'name': 'First'})
+    journal.append([{'id': cart[0]['id'], 'quantity': 1}], {'name': 'Broken'})
+    journal.append(cart, {'name': 'Last'})
+
+    assert sync_journal(journal) == 2
+    assert journal.pending_count() == 1
+    sync_journal(journal)
+    assert (journal.pending_count(), journal.failed_count()) == (0, 1)
+
+    assert journal.reset_failed() == 1
+    assert journal.pending_count() == 1
+    assert {o.customer_name for o in Order.query} == {'First', 'Last'}
+
+
+def test_legacy_dollar_carts_are_replayed_in_cents(journal, cart):
+    legacy = [dict(cart[0], price=cart[0]['price_cents'] / 100)]
+    del legacy[0]['price_cents']
+    journal.append(legacy, {'name': 'Sam'})
+    sync_journal(journal)
+    db.session.expire_all()
+    assert Order.query.one().total_cents == cart[0]['price_cents'] * 2
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Order
+from app.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 5, 1, 12, 30, 15, 250)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_malformed_cursors_are_ignored():
+    for cursor in (None, '', 'not base64!', encode_cursor(datetime(2026, 5, 1), 1)[:-4]):
+        assert decode_cursor(cursor) is None
+
+
+def test_pages_cover_every_row_once_newest_first(app):
+    base = datetime(2026, 5, 1, 12, 0)
+    # Pairs of orders share a timestamp, so ids have to break the ties
+    for i in range(7):
+        db.session.add(Order(order_number=f'ORD-{i:08d}', customer_name='Sam', total_cents=100,
+                             created_at=base + timedelta(minutes=i // 2)))
+    db.session.commit()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = keyset_page(Order.query, Order.created_at, Order.id, cursor=cursor, limit=3)
+        seen.extend(rows)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert len({o.id for o in seen}) == 7
+    assert [(o.created_at, o.id) for o in seen] == sorted(((o.created_at, o.id) for o in seen), reverse=True)
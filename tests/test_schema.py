@@ -0,0 +1,90 @@
+import sys
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from app.schema import pending_migrations, run_migrations
+from config import Config
+
+
+@pytest.fixture
+def legacy_engine(app, tmp_path):
+    """A database laid out like one from before cents and locations"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE menu_item (id INTEGER PRIMARY KEY, name VARCHAR(100), '
+                          'price FLOAT, price_cents INTEGER DEFAULT 0)'))
+        conn.execute(text("INSERT INTO menu_item (name, price) VALUES ('a', 7.99), ('b', 12.5), ('c', 0.125)"))
+        conn.execute(text('CREATE TABLE "order" (id INTEGER PRIMARY KEY, created_at DATETIME, status VARCHAR(20))'))
+        conn.execute(text('CREATE TABLE daily_sales (id INTEGER PRIMARY KEY, date DATE NOT NULL UNIQUE, '
+                          'total_orders INTEGER, total_revenue FLOAT, total_revenue_cents INTEGER DEFAULT 0)'))
+        conn.execute(text("INSERT INTO daily_sales (date, total_orders, total_revenue) VALUES ('2026-05-01', 3, 30.5)"))
+    yield engine
+    engine.dispose()
+
+
+def test_money_is_rounded_to_cents_and_dollar_columns_dropped(legacy_engine):
+    run_migrations(legacy_engine)
+    with legacy_engine.connect() as conn:
+        prices = dict(conn.execute(text('SELECT name, price_cents FROM menu_item')).all())
+    assert prices == {'a': 799, 'b': 1250, 'c': 13}
+    assert 'price' not in {c['name'] for c in inspect(legacy_engine).get_columns('menu_item')}
+
+
+def test_daily_sales_is_unique_per_location_and_day(legacy_engine):
+    run_migrations(legacy_engine)
+    with legacy_engine.begin() as conn:
+        assert conn.execute(text('SELECT location, total_revenue_cents FROM daily_sales')).one() == ('main', 3050)
+        conn.execute(text("INSERT INTO daily_sales (location, date, total_orders) VALUES ('north', '2026-05-01', 1)"))
+
+
+def test_migrations_run_once(legacy_engine):
+    assert len(pending_migrations(legacy_engine)) == 2
+    run_migrations(legacy_engine)
+    assert pending_migrations(legacy_engine) == []
+    run_migrations(legacy_engine)
+
+
+def test_new_databases_need_no_migration(app):
+    assert pending_migrations() == []
+
+
+def test_app_refuses_to_start_until_money_is_migrated(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crispy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE menu_item (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, price FLOAT)'))
+        conn.execute(text("INSERT INTO menu_item (name, price) VALUES ('a', 7.99)"))
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', str(engine.url))
+    monkeypatch.setattr(Config, 'LOG_DIR', str(tmp_path / 'logs'))
+    from app import create_app, db
+
+    with pytest.raises(RuntimeError, match=r'read as \$0\.00'):
+        create_app()
+
+    monkeypatch.setattr(sys, 'argv', ['flask', 'schema', 'migrate'])
+    app = create_app()
+    result = app.test_cli_runner().invoke(args=['schema', 'migrate'])
+    assert 'main: applied money columns to cents' in result.output
+    assert pending_migrations(engine) == []
+    with app.app_context():
+        for app_engine in db.engines.values():
+            app_engine.dispose()
+    engine.dispose()
+
+
+def test_order_summaries_are_backfilled_by_the_migration(app):
+    from app import db
+    from app.models import MenuItem, Order
+    from app.orders import place_order
+
+    item = MenuItem.query.first()
+    order, _ = place_order([{'id': item.id, 'name': item.name, 'price_cents': item.price_cents, 'quantity': 2}],
+                           {'name': 'Sam'})
+    db.session.commit()
+    with db.engine.begin() as conn:
+        conn.execute(text('UPDATE "order" SET items_summary = NULL, item_count = NULL'))
+    assert pending_migrations() == ['order summaries']
+
+    run_migrations()
+    db.session.expire_all()
+    order = db.session.get(Order, order.id)
+    assert (order.item_count, order.items_summary) == (2, f'2× {item.name}')
+    assert pending_migrations() == []
@@ -0,0 +1,25 @@
+from app.catalog import get_catalog
+from app.search import search_menu
+
+
+def test_category_is_filtered_before_the_limit(app):
+    catalog = get_catalog()
+    best = search_menu('chicken', limit=1)[0]
+    other = next(item['category'] for item in catalog
+                 if item['category'] != best['category'] and 'chicken' in item['name'].lower())
+
+    results = search_menu('chicken', limit=1, category=other)
+    assert [item['category'] for item in results] == [other]
+
+
+def test_menu_page_search_keeps_category_matches(app, client):
+    results = search_menu('chicken', category='combos')
+    assert results
+    page = client.get('/menu?q=chicken&category=combos').get_data(as_text=True)
+    for item in results:
+        assert item['name'] in page
+
+
+def test_search_api_accepts_a_category(app, client):
+    response = client.get('/api/menu/search?q=chicken&category=combos&limit=1')
+    assert [item['category'] for item in response.json['results']] == ['combos']
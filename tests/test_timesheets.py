@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import StaffClockIn, StaffCode, TimesheetDay, TimesheetRollup
+from app.timesheets import get_daily_hours
+
+
+@pytest.fixture
+def shift(make_user):
+    staff = make_user('cook@example.com', role='staff')
+    clock_in = datetime.combine(datetime.utcnow().date() - timedelta(days=3), datetime.min.time()) + timedelta(hours=9)
+    db.session.add(StaffClockIn(user_id=staff.id, clock_in=clock_in,
+                                clock_out=clock_in + timedelta(hours=8), break_minutes=30))
+    db.session.commit()
+    return staff, clock_in.date()
+
+
+def test_rollups_are_stored_without_committing_the_request_session(app, shift):
+    staff, day = shift
+    db.session.add(StaffCode(code='UNSAVED', role='staff'))
+
+    with db.session.no_autoflush:
+        hours = get_daily_hours(day, day + timedelta(days=1))
+    assert hours[(staff.id, day)]['worked_seconds'] == 8 * 3600
+
+    db.session.rollback()
+    assert StaffCode.query.filter_by(code='UNSAVED').first() is None
+    assert db.session.get(TimesheetDay, day) is not None
+    assert TimesheetRollup.query.filter_by(day=day, user_id=staff.id).one().break_minutes == 30
+
+
+def test_frozen_days_are_served_from_rollups(app, shift):
+    staff, day = shift
+    get_daily_hours(day, day + timedelta(days=1))
+    StaffClockIn.query.execution_options(all_locations=True).delete()
+    db.session.commit()
+    assert get_daily_hours(day, day + timedelta(days=1))[(staff.id, day)]['shifts'] == 1
+
+
+def test_timesheet_api_clamps_limit(app, client, make_user, login, shift):
+    login(make_user('boss@example.com', role='manager'))
+    response = client.get('/manager/api/timesheets?limit=0')
+    assert response.status_code == 200
+    assert response.json['next_before'] < response.json['before']
+
+
+@pytest.mark.parametrize('path', ['/manager/api/timesheets', '/manager/timesheets.csv'])
+def test_timesheet_exports_refuse_staff_with_403(app, client, make_user, login, path):
+    login(make_user('cook@example.com', role='staff'))
+    response = client.get(path)
+    assert response.status_code == 403
+    assert 'manager' in response.json['error']
+
+
+def test_dashboard_pages_still_redirect(app, client, make_user, login):
+    login(make_user('guest@example.com'))
+    assert client.get('/manager').status_code == 302
@@ -0,0 +1,47 @@
+import pytest
+from app import db
+from app.models import load_user
+
+
+@pytest.mark.parametrize('backend', ['memory', 'stub'])
+def test_cached_login_user_leaves_out_the_password_hash(app, make_user, backend):
+    from app.cache import init_cache
+    app.config['CACHE_BACKEND'] = backend
+    init_cache(app)
+    user_id = make_user('sam@example.com', password='s3cret').id
+    db.session.remove()
+
+    load_user(str(user_id))
+    _, _, cached = app.extensions['cache'].get(f'user:{user_id}')
+    assert 'password_hash' not in cached
+    assert cached['email'] == 'sam@example.com'
+
+    db.session.remove()
+    user = load_user(str(user_id))
+    assert user.check_password('s3cret')
+    assert not user.check_password('wrong')
+
+
+def test_password_change_on_cached_user_is_saved(app, make_user):
+    user_id = make_user('sam@example.com', password='old').id
+    db.session.remove()
+
+    user = load_user(str(user_id))
+    user.set_password('new')
+    db.session.commit()
+    db.session.remove()
+
+    assert load_user(str(user_id)).check_password('new')
+
+
+def test_demoted_manager_loses_access_despite_cached_user(app, client, make_user, login):
+    from sqlalchemy import text
+    manager = make_user('boss@example.com', role='manager')
+    login(manager)
+    assert client.get('/manager/api/cache').status_code == 200
+
+    # Another worker demotes them; this worker's cached user still says manager
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE user SET role = 'customer' WHERE id = :id"), {'id': manager.id})
+    assert client.get('/manager/api/cache').status_code == 403
+    assert client.get('/manager/api/stats').status_code == 403